@@ -0,0 +1,163 @@
+import multiprocessing
+import pickle
+import queue
+import time
+import traceback
+from collections import namedtuple
+
+# result of a single job. status is one of 'done', 'error', 'timeout', or 'skipped'
+BenchResult = namedtuple('BenchResult', ['bench', 'status', 'value', 'elapsed'])
+
+
+def _open_instruments(instruments):
+    opened = {}
+    for name, (cls, address) in instruments.items():
+        if type(cls) is str:
+            # inst is imported here (inside the worker process) so that every worker gets its own VISA resource manager
+            import inst
+            cls = getattr(inst, cls)
+        opened[name] = cls(address)
+    return opened
+
+
+def _bench_worker(bench, instruments, jobs, results):
+    """Worker loop for a single bench. Opens the bench instruments, then runs jobs until a None job is received."""
+    try:
+        opened = _open_instruments(instruments)
+    except Exception:
+        results.put((bench, None, 'error', traceback.format_exc()))
+        return
+
+    results.put((bench, None, 'ready', None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+
+        job_id, func, args, kwargs = job
+        results.put((bench, job_id, 'started', time.time()))
+        try:
+            value = func(opened, *args, **kwargs)
+            # the queue pickles on a background thread, where an error would lose this and every later result of the bench
+            pickle.dumps(value)
+            results.put((bench, job_id, 'done', value))
+        except Exception:
+            results.put((bench, job_id, 'error', traceback.format_exc()))
+
+
+class BenchRunner:
+    """Runs measurement jobs on several independent benches at once, with one worker process per bench (e.g. one per GPIB board).
+
+    benches is a dictionary of bench name to a dictionary of instruments, where each instrument is a tuple of the inst.py class (or its name) and the VISA address:
+
+    runner = bench.BenchRunner({
+        'bench0': {'pna': ('PNA_E8364B', 'GPIB0::16::INSTR')},
+        'bench1': {'pna': ('PNA_E8364B', 'GPIB1::16::INSTR'), 'dc': ('DC_E3649A', 'GPIB1::5::INSTR')},
+    })
+
+    Jobs are functions called as func(instruments, *args, **kwargs), where instruments is the dictionary of opened drivers for the bench.
+    Jobs must be defined at the module level so that they can be sent to the worker processes.
+    """
+
+    def __init__(self, benches, timeout=None, start_method='spawn'):
+        """timeout is the maximum time in seconds a single job, or the opening of the bench instruments, may take before the bench is considered hung and its worker is terminated.
+        Workers are spawned (rather than forked) by default so that no VISA session is shared between processes."""
+        self.benches = benches
+        self.timeout = timeout
+        self.context = multiprocessing.get_context(start_method)
+        self.jobs = {b: [] for b in benches}
+        self.results = {}
+        self.__job_count = 0
+
+    def submit(self, bench, func, *args, **kwargs):
+        """Adds a job to the queue of the given bench. Returns the job id which is used as the key in the results dictionary."""
+        if bench not in self.benches:
+            raise ValueError("Bench " + str(bench) + " is not defined.")
+
+        job_id = self.__job_count
+        self.__job_count += 1
+        self.jobs[bench].append((job_id, func, args, kwargs))
+        return job_id
+
+    def run(self, callback=None):
+        """Runs all submitted jobs and blocks until every bench has finished, failed, or timed out.
+        Results are collected into self.results (job id -> BenchResult), which is also returned. If given, callback(job_id, result) is called as each result arrives."""
+        results = self.context.Queue()
+        workers = {}
+        queues = {}
+        pending = {}
+        # spawn time of each bench still opening its instruments, which is also limited by the timeout
+        opening = {}
+
+        for b, instruments in self.benches.items():
+            if len(self.jobs[b]) == 0:
+                continue
+
+            # the job queues are kept referenced until the run ends, the spawned workers attach to them after start() returns
+            queues[b] = self.context.Queue()
+            for j in self.jobs[b]:
+                queues[b].put(j)
+            queues[b].put(None)
+
+            p = self.context.Process(target=_bench_worker, args=(b, instruments, queues[b], results), daemon=True)
+            p.start()
+            opening[b] = time.time()
+            workers[b] = p
+            pending[b] = [j[0] for j in self.jobs[b]]
+            self.jobs[b] = []
+
+        # start time of the job currently running on each bench
+        running = {}
+
+        def record(job_id, b, status, value, elapsed):
+            r = BenchResult(b, status, value, elapsed)
+            self.results[job_id] = r
+            if job_id in pending[b]:
+                pending[b].remove(job_id)
+            if callback is not None:
+                callback(job_id, r)
+
+        def fail_bench(b, status, value):
+            # mark every remaining job on this bench so that one hung instrument does not stall the rest
+            for job_id in list(pending[b]):
+                record(job_id, b, status, value, None)
+                status = 'skipped'
+            running.pop(b, None)
+            opening.pop(b, None)
+
+        while any(len(p) > 0 for p in pending.values()):
+            try:
+                b, job_id, status, value = results.get(timeout=0.1)
+            except queue.Empty:
+                b = None
+
+            if b is not None:
+                if status == 'ready':
+                    opening.pop(b, None)
+                elif status == 'started':
+                    running[b] = (job_id, value)
+                elif job_id is None:
+                    # the bench failed to open its instruments
+                    fail_bench(b, status, value)
+                else:
+                    _, start = running.pop(b, (None, time.time()))
+                    record(job_id, b, status, value, time.time() - start)
+
+            now = time.time()
+            for w, p in workers.items():
+                if len(pending[w]) == 0:
+                    continue
+
+                if self.timeout is not None and ((w in running and now - running[w][1] > self.timeout) or (w in opening and now - opening[w] > self.timeout)):
+                    p.terminate()
+                    fail_bench(w, 'timeout', None)
+                elif not p.is_alive() and results.empty():
+                    fail_bench(w, 'error', 'Worker exited with code ' + str(p.exitcode))
+
+        for p in workers.values():
+            p.join(1)
+            if p.is_alive():
+                p.terminate()
+
+        return self.results
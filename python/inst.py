@@ -1,3 +1,5 @@
+import queue
+import threading
 import pyvisa
 import numpy
 
@@ -104,9 +106,8 @@ class NoiseFigure_8970B(Instrument):
 
     """Table of error messages starts on 3-95."""
 
-    def meas_temp(self, freq, source_on=True, calibrated=True):
-        """See section 3-200. This returns the CALIBRATED power density relative to 290K (-174dBm/Hz).
-        If source_on, then the 28V output is set to on, off if false. This function returns the temperature."""
+    def __read_density_db(self, freq, source_on, calibrated):
+        # returns the frequency and the power density in dB relative to 290K
         self.set_frequency(freq)
 
         # set a status bit to trigger when data is complete
@@ -124,11 +125,24 @@ class NoiseFigure_8970B(Instrument):
             else:
                 f, _, db = (float(f) for f in self.inst.query('H1 EN N5').split(',')) # noise source off, uncalibrated
 
+        return f, db
+
+    def meas_temp(self, freq, source_on=True, calibrated=True):
+        """See section 3-200. This returns the CALIBRATED power density relative to 290K (-174dBm/Hz).
+        If source_on, then the 28V output is set to on, off if false. This function returns the temperature."""
+        f, db = self.__read_density_db(freq, source_on, calibrated)
         return (f, 290*numpy.power(10, db/10))
 
+    def meas_hot_cold(self, freqs, calibrated=False):
+        """Measures the noise temperature with the noise source on and off at every frequency in freqs (MHz). Returns the frequency, hot and cold temperature arrays,
+        which can be processed with noise.analyze. Use calibrated=False and the ENR table of the source to do the Y-factor calculation on the host."""
+        data = numpy.asarray([self.__read_density_db(freq, source_on, calibrated) for freq in freqs for source_on in (True, False)]).reshape(-1, 2, 2)
+        return data[:, 0, 0], 290*numpy.power(10, data[:, 0, 1]/10), 290*numpy.power(10, data[:, 1, 1]/10)
 
-    def meas_power_density(self, source_on=True):
-        return self.meas_temp(source_on)*self.k
+    def meas_power_density(self, freq, source_on=True, calibrated=True):
+        """Returns the frequency and the power density (W/Hz) at the measurement frequency, see meas_temp."""
+        f, t = self.meas_temp(freq, source_on, calibrated)
+        return (f, t*self.k)
 
     def load_enr(self, enr_pairs):
         """See the manual pages 3-87 to see ENR programming."""
@@ -481,6 +495,9 @@ class PNA_E8364B(Instrument):
         self.inst.write("CALC:PAR:DEF 'CH1_S12',S12")
         self.inst.write("DISP:WIND2:TRAC1:FEED 'CH1_S12'")
 
+        # the last uploaded segment table, see set_segment_sweep
+        self.__segments = None
+
     def get_start_stop(self):
         start = float(self.inst.query("SENS:FREQ:START?"))
         stop = float(self.inst.query("SENS:FREQ:STOP?"))
@@ -494,6 +511,54 @@ class PNA_E8364B(Instrument):
         return start, stop
         # return numpy.linspace(start, stop, points)
 
+    @staticmethod
+    def get_segment_frequencies(segments):
+        """Returns the frequency of every point of a segment table (see set_segment_sweep), in sweep order."""
+        return numpy.concatenate([numpy.linspace(seg[0], seg[1], int(seg[2])) for seg in segments])
+
+    def set_segment_sweep(self, segments):
+        """Sets up a segment sweep (pg. 2130). segments is a list of (start, stop, points, ifbw, power) tuples with frequencies in Hz, the IF bandwidth in Hz and the power in dBm,
+        e.g. a narrow IF bandwidth only in the stopband of a filter. ifbw and power may be left out (or None) to use the current channel settings.
+        The whole table is uploaded in one command, and not at all if it is the same as the last table and the instrument still has its segment count and points. Returns the frequency axis of the sweep."""
+        # the table is compared after the channel settings are filled in, so a changed IF bandwidth or power is uploaded again
+        defaults = None
+        table = []
+        for seg in segments:
+            seg = tuple(seg) + (None,)*(5 - len(seg))
+            if (seg[3] is None or seg[4] is None) and defaults is None:
+                defaults = (float(self.inst.query("SENS:BWID?")), float(self.inst.query("SOUR:POW?")))
+            table.append((float(seg[0]), float(seg[1]), int(seg[2]),
+                          defaults[0] if seg[3] is None else float(seg[3]),
+                          defaults[1] if seg[4] is None else float(seg[4])))
+        table = tuple(table)
+        frequencies = self.get_segment_frequencies(table)
+
+        # the table may have been changed on the front panel or by another program, so the instrument is checked before the upload is skipped
+        uploaded = False
+        if table == self.__segments and int(self.inst.query("SENS:SEGM:COUN?")) == len(table):
+            self.inst.write("SENS:SWE:TYPE SEGM")
+            uploaded = int(self.inst.query("SENS:SWE:POIN?")) == len(frequencies)
+
+        if not uploaded:
+            # each segment is state, points, start, stop, ifbw, dwell time and power
+            values = []
+            for start, stop, points, ifbw, power in table:
+                values += ['1', str(points), str(start), str(stop), str(ifbw), '0', str(power)]
+            self.inst.write("SENS:SEGM:BWID:CONT ON;:SENS:SEGM:POW:CONT ON")
+            self.inst.write("SENS:SEGM:LIST SSTOP," + ','.join(values))
+            self.inst.write("SENS:SWE:TYPE SEGM")
+            self.__segments = table
+
+        return frequencies
+
+    def set_linear_sweep(self, start, stop, points, ifbw=None):
+        """Sets up a linear sweep from start to stop (Hz). The segment table is kept on the instrument, so switching back to the same segment sweep does not upload it again."""
+        self.inst.write("SENS:SWE:TYPE LIN")
+
+        self.inst.write("SENS:FREQ:STAR " + str(start) + ";:SENS:FREQ:STOP " + str(stop) + ";:SENS:SWE:POIN " + str(int(points)))
+        if ifbw is not None:
+            self.inst.write("SENS:BWID " + str(ifbw))
+
     def get_data(self, param):
         """param selects which parameters (e.g. S11, S21, etc..)"""
 
@@ -515,9 +580,12 @@ class PNA_E8364B(Instrument):
         imag = data[1::2]
         s = real + 1j*imag
 
-        points = len(real)
-        start, stop = self.get_start_stop()
-        f = numpy.linspace(start, stop, points)
+        # a segment sweep is not evenly spaced, so its frequency axis is read from the instrument
+        if self.inst.query("SENS:SWE:TYPE?").strip().upper().startswith('SEGM'):
+            f = self.inst.query_binary_values("CALC:X?", datatype='d', container=numpy.array, is_big_endian=True)
+        else:
+            start, stop = self.get_start_stop()
+            f = numpy.linspace(start, stop, len(real))
 
         return s, f
 
@@ -527,6 +595,12 @@ class DSOX_OScope(Instrument):
     def __init__(self, address):
         super(DSOX_OScope, self).__init__(address)
 
+        # acquisition loop state, see start_acquisition
+        self.__acq_stop = None
+        self.__acq_count = None
+        self.__acq_threads = []
+        self.__acq_error = None
+
     # Root Commands
     def opc(self):
         return self.inst.query("*OPC?")
@@ -672,7 +746,7 @@ class DSOX_OScope(Instrument):
             self.inst.write(":ACQUIRE:SEGMENTED:INDEX " + str(index))
     
     def get_segmented_index(self):
-        return self.inst.query(int(":ACQUIRE:SEGMENTED:INDEX?"))
+        return int(self.inst.query(":ACQUIRE:SEGMENTED:INDEX?"))
 
     def get_segmented_count(self):
         return int(self.inst.query(":WAVEFORM:SEGMENTED:COUNT?"))
@@ -734,7 +808,7 @@ class DSOX_OScope(Instrument):
         return self.__get_measure("VAMP")
 
     def init_meas_vpp(self, source, opt):
-        s = "VPP" + source
+        s = "VPP " + source
         if source == "CHAN":
             self.__start_measure(s + str(opt))
         else:
@@ -759,16 +833,129 @@ class DSOX_OScope(Instrument):
 
         return tuple(values)
 
-    def get_waveform(self, source, opt):
-        self.set_source(source, opt)
-
-        # configure waveform format
+    def __set_format(self):
+        # configure waveform format, sent for every download (or acquisition run) as it may have been changed since
         self.inst.write(":WAV:BYT LSBF")
         self.inst.write(":WAV:UNS 0")
         self.inst.write(":WAV:FORM WORD")
 
+    def __is_clipped(self, data):
+        # clipped low (0x0100) and high (0xFF00) codes of the WORD format, as signed words
+        return bool(numpy.any(numpy.isin(data, (0x0100 - 0x8000, 0xFF00 - 0x8000))))
+
+    def __get_preamble(self):
+        return self.__parse_preamble(self.inst.query(":WAV:PRE?"))
+
+    def __download(self, channels, preambles):
+        # raw data and preamble of every channel. preambles (channel -> preamble) is kept for one get_waveforms call or acquisition run,
+        # a preamble is queried again when the number of points no longer matches it
+        data = []
+        used = []
+        for c in channels:
+            self.set_source('CHAN', c)
+            if c not in preambles:
+                preambles[c] = self.__get_preamble()
+            data.append(self.inst.query_binary_values(":WAV:DATA?", datatype='h', is_big_endian=False, container=numpy.array))
+            if len(data[-1]) != int(preambles[c][2]):
+                preambles[c] = self.__get_preamble()
+            used.append(preambles[c])
+        return data, used
+
+    def __convert(self, data, preambles):
+        # converts raw data into the time values and a (channels, points) array of voltages, the time base is shared by every channel
+        _, _, points, _, xinc, xorigin, xref, _, _, _ = preambles[0]
+        yinc = numpy.asarray([p[7] for p in preambles])[:, None]
+        yorigin = numpy.asarray([p[8] for p in preambles])[:, None]
+
+        time_values = xorigin + numpy.arange(0, points)*xinc
+        return time_values, numpy.asarray(data)*yinc + yorigin
+
+    def get_waveforms(self, channels):
+        """Downloads the last acquisition of several channels (a list of channel numbers, e.g. after digitize). Returns the time values and a (channels, points) array of voltages.
+        The waveform format is configured once and one preamble is read per channel."""
+        self.__set_format()
+        return self.__convert(*self.__download(channels, {}))
+
+    def __acquire_loop(self, channels, frames, count):
+        # captures and downloads frames as fast as the scope triggers, the conversion and consumer run on another thread
+        try:
+            # the format is set and the preambles are read once per run, and the preambles again if the number of points changes
+            self.__set_format()
+            preambles = {}
+            n = 0
+            while not self.__acq_stop.is_set() and (count is None or n < count):
+                self.digitize(['CHAN']*len(channels), channels)
+                self.opc()
+                data = self.__download(channels, preambles)
+
+                # a full queue means the consumer is behind, wait for it without missing a stop
+                while not self.__acq_stop.is_set():
+                    try:
+                        frames.put(data, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                n += 1
+        except Exception as e:
+            self.__acq_error = e
+        finally:
+            frames.put(None)
+
+    def __consume_loop(self, channels, frames, consumer):
+        try:
+            while True:
+                data = frames.get()
+                if data is None:
+                    break
+                consumer(*self.__convert(*data))
+        except Exception as e:
+            self.__acq_error = e
+            self.__acq_stop.set()
+            # unblock the acquisition thread
+            while frames.get() is not None:
+                pass
+
+    def start_acquisition(self, channels, consumer, count=None, queue_size=2):
+        """Repeatedly digitizes and downloads the channels (a list of channel numbers) on a background thread, re-arming the scope as soon as each frame has been read.
+        consumer(time_values, v) is called on a second thread for every frame, where v is a (channels, points) array of voltages.
+        At most queue_size frames wait for the consumer. Runs for count frames, or until stop_acquisition. Do not send other commands to the scope while it runs."""
+        self.stop_acquisition()
+
+        frames = queue.Queue(maxsize=queue_size)
+        self.__acq_stop = threading.Event()
+        self.__acq_count = count
+        self.__acq_error = None
+        self.__acq_threads = [
+            threading.Thread(target=self.__acquire_loop, args=(channels, frames, count), daemon=True),
+            threading.Thread(target=self.__consume_loop, args=(channels, frames, consumer), daemon=True),
+        ]
+        for t in self.__acq_threads:
+            t.start()
+
+    def stop_acquisition(self, wait=False):
+        """Stops the loop started by start_acquisition. If wait, the count frames given to start_acquisition are captured and consumed first.
+        Errors raised on the acquisition or consumer threads are raised here."""
+        if self.__acq_stop is None:
+            return
+
+        if not wait or self.__acq_count is None:
+            self.__acq_stop.set()
+        for t in self.__acq_threads:
+            t.join()
+        self.__acq_stop = None
+        self.__acq_threads = []
+
+        if self.__acq_error is not None:
+            e = self.__acq_error
+            self.__acq_error = None
+            raise e
+
+    def get_waveform(self, source, opt):
+        self.set_source(source, opt)
+        self.__set_format()
+
         # start with the waveform preamble so that the time base and voltages can be confiugred
-        _, _, points, _, xinc, xorigin, xref, yinc, yorigin, yref = self.__parse_preamble(self.inst.query(":WAV:PRE?"))
+        _, _, points, _, xinc, xorigin, xref, yinc, yorigin, yref = self.__get_preamble()
 
         # now read the data
         data = self.inst.query_binary_values(":WAV:DATA?", datatype='h', is_big_endian=False, container=numpy.array)
@@ -778,11 +965,10 @@ class DSOX_OScope(Instrument):
         # values of 0x00 or 0x0000 are holes, which is where data hasn't been acquired
         # 0x01 or 0x0100 — Clipped low. These are locations where the waveform is clipped at the bottom of the oscilloscope display
         # 0xFF or 0xFF00 — Clipped high. These are locations where the waveform is clipped at the top of the oscilloscope display.
+        # these are the unsigned codes, the data is read as signed words (:WAV:UNS 0) where they are offset by 0x8000
 
         # check for clipped high or clipped low
-        clipped = False
-        if numpy.any(data, where=0xFF) or numpy.any(data, where=0xFF00) or numpy.any(data, where=0x01) or numpy.any(data, where=0x0100):
-            clipped=True
+        clipped = self.__is_clipped(data)
 
         # converted_data = (data - data[int(yref)]) * yinc + yorigin
         converted_data = (data) * yinc + yorigin
@@ -792,4 +978,27 @@ class DSOX_OScope(Instrument):
 
         return time_values, converted_data, clipped
     
-    
\ No newline at end of file
+    
+
+    def get_segmented_waveforms(self, source, opt):
+        """Downloads every segment of a segmented acquisition. Returns the time values, a (segments, points) array of voltages, and whether any segment is clipped.
+        The result can be measured for all segments at once with the waveform module."""
+        self.set_source(source, opt)
+        self.__set_format()
+
+        # every segment has the same preamble
+        _, _, points, _, xinc, xorigin, xref, yinc, yorigin, yref = self.__get_preamble()
+
+        count = self.get_segmented_count()
+        data = numpy.empty((count, int(points)))
+        for i in range(count):
+            self.set_segmented_index(i + 1)
+            segment = self.inst.query_binary_values(":WAV:DATA?", datatype='h', is_big_endian=False, container=numpy.array)
+            if len(segment) != len(data[i]):
+                raise ValueError("Segment " + str(i + 1) + " has " + str(len(segment)) + " points, but the preamble has " + str(int(points)) + ".")
+            data[i] = segment
+
+        clipped = self.__is_clipped(data)
+
+        time_values = xorigin + numpy.arange(0, points)*xinc
+        return time_values, data*yinc + yorigin, clipped
@@ -1,83 +1,147 @@
+import functools
+import queue
+import threading
+import matplotlib
 from matplotlib import pyplot
 from matplotlib import patches
+from matplotlib import collections
+from matplotlib import transforms
+from matplotlib.path import Path
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy
 
+import rfcircles
+
+# number of vertices used for each grid arc
+arc_points = 128
+
+# the default smith chart grid regions, each is (resistance_bounds, reactance_bounds, dr, dx), see add_smith_region for details
+default_regions = (
+    ((-1, 1), (0, 1), 0.1, 0.1),
+    ((-2, 2), (0, 2), 0.2, 0.2),
+    ((-5, 5), (0, 5), 1, 1),
+    ((-10, 10), (0, 10), 5, 5),
+)
+
+# major impedance lables
+default_real_labels = (0.2, 0.4, 0.6, 0.8, 1, 2, 3, 5, 10)
+default_imag_labels = (0.2, 0.4, 0.6, 0.8, 1, 2, 3, 4, 5, 10)
+
+def grid_collection(vertices, alpha=0.5, linewidth=0.5, **kwargs):
+    """Returns a LineCollection for grid arcs (as returned by the jdsmith.get_*_vertices functions)."""
+    # keep the look of the patches.Arc grid this replaced (patch edge color, drawn below lines)
+    if 'color' not in kwargs and 'colors' not in kwargs and 'edgecolor' not in kwargs:
+        kwargs['color'] = matplotlib.rcParams['patch.edgecolor']
+    kwargs.setdefault('zorder', 1)
+
+    return collections.LineCollection(vertices, alpha=alpha, linewidth=linewidth, **kwargs)
+
 class jdsmith:
     axis = None
 
-    def bilinear_transform(self, z):
+    @staticmethod
+    def bilinear_transform(z):
         return (z-1)/(z+1)
 
-    def get_admittance_angle(self, R, Y):
+    @staticmethod
+    def get_admittance_angle(R, Y):
         r = (R-1)/(R+1)
         centerx = 1-(1-r)/2
-        w = self.bilinear_transform(R + 1j*Y)
+        w = jdsmith.bilinear_transform(R + 1j*Y)
         wx = numpy.real(w)
         wy = numpy.imag(w)
         return numpy.rad2deg(numpy.arctan2(wy,wx-centerx))
 
-    def add_constant_admittance(self, linedef, alpha=0.5, linewidth=0.5, **kwargs):
-        # linedef should be a list of tuples where the tupe is (Y, startR, stopR)
-        # where Y is the admittance line, and R refers to the constnat resistance line
-        for l in linedef:
-            Y = l[0]
-            if numpy.abs(Y) < 1e-10:
-                continue
+    @staticmethod
+    def get_arc_vertices(center, radius, angle, theta1, theta2, points=arc_points):
+        """Returns an array of shape (len(radius), points, 2) tracing each arc counter clockwise from theta1 to theta2 (in degrees), rotated by angle. Matches the arcs drawn by patches.Arc."""
+        center = numpy.asarray(center, dtype=complex)
+        radius = numpy.asarray(radius, dtype=float)
+        theta1 = numpy.asarray(theta1, dtype=float)
+        theta2 = numpy.asarray(theta2, dtype=float)
 
-            d1 = self.get_admittance_angle(l[2], Y)
-            d2 = self.get_admittance_angle(l[1], Y)
+        # same wrapping rule as patches.Arc, the arc always runs counter clockwise and equal angles (mod 360) give a full circle
+        sweep = numpy.mod(theta2 - theta1, 360)
+        sweep = numpy.where((sweep == 0) & (theta1 != theta2), 360, sweep)
 
-            # print(Y, d1, d2)
+        t = numpy.deg2rad(theta1[:, None] + angle + sweep[:, None]*numpy.linspace(0, 1, points))
+        w = center[:, None] + radius[:, None]*numpy.exp(1j*t)
+        return numpy.stack((numpy.real(w), numpy.imag(w)), axis=-1)
 
-            r = 1/Y
+    @staticmethod
+    def get_constant_admittance_vertices(linedef):
+        """Returns the vertices of the constant reactance arcs for a linedef of (Y, startR, stopR) tuples, see add_constant_admittance."""
+        linedef = numpy.asarray(linedef, dtype=float).reshape(-1, 3)
+        linedef = linedef[numpy.abs(linedef[:, 0]) >= 1e-10]
 
-            if Y > 0:
-                a = patches.Arc((1, r), 2*r, 2*r,  angle=90, theta1=d2, theta2=d1, alpha=alpha, linewidth=linewidth, **kwargs)
-            else:
-                a = patches.Arc((1, r), 2*r, 2*r,  angle=90, theta2=d2, theta1=d1, alpha=alpha, linewidth=linewidth, **kwargs)
+        Y = linedef[:, 0]
+        d1 = jdsmith.get_admittance_angle(linedef[:, 2], Y)
+        d2 = jdsmith.get_admittance_angle(linedef[:, 1], Y)
 
-            self.axis.add_patch(a)
+        r = 1/Y
 
-    def add_constant_resistance(self, linedef, alpha=0.5, linewidth=0.5, **kwargs):
-        # linedef should be a list of tuples where the tupe is (R, startY, stopY)
-        # where Y is the admittance line, and R refers to the constnat resistance line
-        for l in linedef:
-            R = l[0]
-            
-            if R == 0: 
-                continue
+        # the direction of the arc flips for negative reactances (the negative radius mirrors the arc through its center, as a negative width does for patches.Arc)
+        theta1 = numpy.where(Y > 0, d2, d1)
+        theta2 = numpy.where(Y > 0, d1, d2)
 
-            d1 = self.get_admittance_angle(R, l[1])
-            d2 = self.get_admittance_angle(R, l[2])
-            
-            r = (R-1)/(R+1)
+        return jdsmith.get_arc_vertices(1 + 1j*r, r, 90, theta1, theta2)
 
-            a = patches.Arc((1-(1-r)/2, 0), 1-r, 1-r, angle=0, theta1=d2, theta2=d1, linewidth=linewidth, alpha=alpha, **kwargs)
-            self.axis.add_patch(a)
+    @staticmethod
+    def get_constant_resistance_vertices(linedef):
+        """Returns the vertices of the constant resistance arcs for a linedef of (R, startY, stopY) tuples, see add_constant_resistance."""
+        linedef = numpy.asarray(linedef, dtype=float).reshape(-1, 3)
+        linedef = linedef[linedef[:, 0] != 0]
 
-    def add_smith_region(self, resistance_bounds, reactance_bounds, dr=0.1, dx=0.1, alpha=0.5, linewidth=0.5, **kwargs):
-        """Generates a Smith chart grid and adds it to the provided axis. resistance_bounds define the limits of each resistance circles in terms of reactance lines, and visa-versa for the reactance bounds. dr and dx specify the steps for the grid for the real and imaginary parts of the impedance."""
+        R = linedef[:, 0]
+        d1 = jdsmith.get_admittance_angle(R, linedef[:, 1])
+        d2 = jdsmith.get_admittance_angle(R, linedef[:, 2])
+
+        r = (R-1)/(R+1)
+
+        return jdsmith.get_arc_vertices(1-(1-r)/2, (1-r)/2, 0, d2, d1)
+
+    @staticmethod
+    def get_smith_region_vertices(resistance_bounds, reactance_bounds, dr=0.1, dx=0.1):
+        """Returns the vertices of all grid arcs of a smith chart region, see add_smith_region."""
         resistances = numpy.arange(reactance_bounds[0], reactance_bounds[1], dr)
         resistances = numpy.append(resistances, reactance_bounds[1])
 
         reactances = numpy.arange(resistance_bounds[0], resistance_bounds[1], dx)
         reactances = numpy.append(reactances, resistance_bounds[1])
 
-        lines = []
-        for R in resistances:
-            lines.append((R, resistance_bounds[0], resistance_bounds[1]))
-        self.add_constant_resistance(lines, alpha=alpha, linewidth=linewidth, **kwargs)
+        resistance_lines = numpy.column_stack((resistances, numpy.full(len(resistances), resistance_bounds[0]), numpy.full(len(resistances), resistance_bounds[1])))
+        reactance_lines = numpy.column_stack((reactances, numpy.full(len(reactances), reactance_bounds[0]), numpy.full(len(reactances), reactance_bounds[1])))
 
-        
-        lines = []
-        for Y in reactances:
-            lines.append((Y, reactance_bounds[0], reactance_bounds[1]))
-        self.add_constant_admittance(lines, alpha=alpha, linewidth=linewidth, **kwargs)
+        return numpy.concatenate((jdsmith.get_constant_resistance_vertices(resistance_lines), jdsmith.get_constant_admittance_vertices(reactance_lines)))
 
-    def add_impedance_labels(self, Z, rule=None, rotation=None, size=8, **kwargs):
-        # major resistance lables
+    def add_grid_lines(self, vertices, alpha=0.5, linewidth=0.5, **kwargs):
+        """Adds grid arcs (as returned by the get_*_vertices functions) to the axis as a single LineCollection."""
+        lines = grid_collection(vertices, alpha=alpha, linewidth=linewidth, **kwargs)
+        self.axis.add_collection(lines)
+        return lines
+
+    def add_constant_admittance(self, linedef, alpha=0.5, linewidth=0.5, **kwargs):
+        # linedef should be a list of tuples where the tupe is (Y, startR, stopR)
+        # where Y is the admittance line, and R refers to the constnat resistance line
+        return self.add_grid_lines(self.get_constant_admittance_vertices(linedef), alpha=alpha, linewidth=linewidth, **kwargs)
+
+    def add_constant_resistance(self, linedef, alpha=0.5, linewidth=0.5, **kwargs):
+        # linedef should be a list of tuples where the tupe is (R, startY, stopY)
+        # where Y is the admittance line, and R refers to the constnat resistance line
+        return self.add_grid_lines(self.get_constant_resistance_vertices(linedef), alpha=alpha, linewidth=linewidth, **kwargs)
+
+    def add_smith_region(self, resistance_bounds, reactance_bounds, dr=0.1, dx=0.1, alpha=0.5, linewidth=0.5, **kwargs):
+        """Generates a Smith chart grid and adds it to the provided axis. resistance_bounds define the limits of each resistance circles in terms of reactance lines, and visa-versa for the reactance bounds. dr and dx specify the steps for the grid for the real and imaginary parts of the impedance.
+        The whole region is drawn as a single LineCollection."""
+        return self.add_grid_lines(self.get_smith_region_vertices(resistance_bounds, reactance_bounds, dr=dr, dx=dx), alpha=alpha, linewidth=linewidth, **kwargs)
+
+    @staticmethod
+    def get_impedance_labels(Z, rule=None, rotation=None):
+        """Returns a list of (text, xy, rotation, ha) tuples for labelling the impedances Z, see add_impedance_labels."""
+        labels = []
         for z in Z:
-            w = self.bilinear_transform(z)
+            w = jdsmith.bilinear_transform(z)
 
             d = numpy.rad2deg(numpy.arctan2(numpy.imag(w), numpy.real(w)))
             text_rot = d
@@ -91,188 +155,494 @@ class jdsmith:
                 z = numpy.imag(z)
         
             if d < 0:
-                self.axis.annotate(f" {z:.1f} ", xy=(numpy.real(w), numpy.imag(w)), size=size, rotation_mode='anchor', rotation=180+text_rot, ha='left', va='bottom', **kwargs)
+                labels.append((f" {z:.1f} ", (numpy.real(w), numpy.imag(w)), 180+text_rot, 'left'))
             else:
-                self.axis.annotate(f" {z:.1f} ", xy=(numpy.real(w), numpy.imag(w)), size=size, rotation_mode='anchor', rotation=text_rot, ha='right', va='bottom', **kwargs)
-
-    def plot_input_stability(self, s, clip=True, **kwargs):
-        s11 = s[:, 0, 0]
-        s12 = s[:, 0, 1]
-        s21 = s[:, 1, 0]
-        s22 = s[:, 1, 1]
-
-        delta = s11*s22 - s12*s21
-
-        c = numpy.conj(s11 - delta*numpy.conj(s22))/(numpy.abs(s11)*numpy.abs(s11) - numpy.abs(delta)*numpy.abs(delta))
-        r = numpy.abs(s12*s21/(numpy.abs(s11)*numpy.abs(s11) - numpy.abs(delta)*numpy.abs(delta)))
-
-        # check if the center of the circle is a stable or unstable point
-        stable_outside = numpy.abs(s22 + s12*s21*c/(1-s11*c)) > 1
-
-        # for i in range(0, len(c)-1):
-        #     c1 = c[i]
-        #     r1 = r[i]
-        #     s1 = stable_outside[i]
-
-        #     x1 = numpy.real(c1)
-        #     y1 = numpy.imag(c1)
-
-        #     c2 = c[i+1]
-        #     r2 = r[i+1]
-        #     s2 = stable_outside[i+1]
-
-        #     x2 = numpy.real(c2)
-        #     y2 = numpy.imag(c2)
-
-        #     if s1 and s2:
-        #         if (numpy.abs(c1) - r1) > 1:
-        #             continue
-        #         betap = numpy.arcsin((r2-r1)/numpy.sqrt(numpy.power(x2-x1, 2) + numpy.power(y2-y1, 2)))
-        #         betan = -numpy.arcsin((r2-r1)/numpy.sqrt(numpy.power(x2-x1, 2) + numpy.power(y2-y1, 2)))
+                labels.append((f" {z:.1f} ", (numpy.real(w), numpy.imag(w)), text_rot, 'right'))
 
-        #         gamma = -numpy.arctan2(y2-y1, x2-x1)
+        return labels
 
-        #         alpha = gamma - betap
-
-        #         x3 = x1 + r1*numpy.sin(alpha)
-        #         y3 = y1 + r1*numpy.cos(alpha)
-
-        #         x4 = x2 + r2*numpy.sin(alpha)
-        #         y4 = y2 + r2*numpy.cos(alpha)
-
-        #         # plot
-        #         self.axis.plot([x3, x4], [y3, y4], color='black')
-        #         circ = patches.Circle((numpy.real(c1), numpy.imag(c1)), r1, fill=False, linewidth=1, **kwargs)
-        #         self.axis.add_patch(circ)
-
-        center_radii = zip(c, r, stable_outside)
-
-        for cs, rs, stable in center_radii:
-            if stable:
-                if (numpy.abs(cs) - rs) > 1:
-                    continue
-
-                # fill the circle as the region to avoid
-                circ = patches.Circle((numpy.real(cs), numpy.imag(cs)), rs, fill=False, **kwargs)
-
-            else: 
-                if (numpy.abs(numpy.abs(cs) - rs) > 1):
-                    continue
-
-                circ = patches.Circle((numpy.real(cs), numpy.imag(cs)), rs, fill=False, **kwargs)
+    def add_impedance_labels(self, Z, rule=None, rotation=None, size=8, **kwargs):
+        # major resistance lables
+        for text, xy, text_rot, ha in self.get_impedance_labels(Z, rule=rule, rotation=rotation):
+            self.axis.annotate(text, xy=xy, size=size, rotation_mode='anchor', rotation=text_rot, ha=ha, va='bottom', **kwargs)
+
+    @staticmethod
+    def get_stability_circles(s, port='input'):
+        """Returns the centers, radii and stable_outside flags of the input (source plane) or output (load plane) stability circles for an (N, 2, 2) array of s parameters, see rfcircles.stability_circles."""
+        return rfcircles.stability_circles(s, port)
+
+    @staticmethod
+    def get_unstable_field(c, r, stable_outside, x, y, chunk=256):
+        """Returns a field over the grid x, y (2d arrays) which is negative wherever any of the stability circles marks the point as unstable.
+        The field is the signed distance to the nearest unstable region boundary, so its zero contour traces the swept unstable region."""
+        # circles whose unstable region does not reach the chart cannot change the region inside of it
+        keep = numpy.isfinite(c) & numpy.isfinite(r)
+        keep &= numpy.where(stable_outside, numpy.abs(c) - r <= 1, r - numpy.abs(c) <= 1)
+        c = c[keep]
+        r = r[keep]
+        stable_outside = stable_outside[keep]
+
+        # inside the circle is unstable when the center is unstable, otherwise outside of it
+        sign = numpy.where(stable_outside, 1, -1).astype(numpy.float32)
+        # single precision is plenty for a field sampled on a grid of a couple hundred points across
+        points = numpy.column_stack((numpy.ravel(x), numpy.ravel(y))).astype(numpy.float32)
+        centers = numpy.vstack((numpy.real(c), numpy.imag(c))).astype(numpy.float32)
+        pp = numpy.sum(points*points, axis=1)
+        cc = numpy.sum(centers*centers, axis=0)
+        r = r.astype(numpy.float32)
+
+        field = numpy.full(len(points), numpy.inf, dtype=numpy.float32)
+
+        # circles are processed in chunks to bound the memory of the (points, circles) distance array
+        # the squared distances are expanded as |p|^2 + |c|^2 - 2 p.c so that the bulk of the work is a matrix product
+        for i in range(0, len(r), chunk):
+            d = pp[:, None] + cc[None, i:i+chunk] - 2*(points @ centers[:, i:i+chunk])
+            d = numpy.sqrt(numpy.maximum(d, 0, out=d), out=d)
+            d -= r[None, i:i+chunk]
+            d *= sign[None, i:i+chunk]
+            field = numpy.minimum(field, d.min(axis=1))
+
+        return field.reshape(x.shape)
+
+    def plot_circles(self, c, r, clip=True, **kwargs):
+        """Draws circles of any shape of centers c (complex) and radii r in a single EllipseCollection (e.g. the results of the rfcircles functions).
+        Circles with non finite centers or radii are skipped. kwargs are passed to the collection, the default look is the same as an unfilled patches.Circle."""
+        c, r = numpy.broadcast_arrays(numpy.asarray(c), numpy.asarray(r))
+        c = c.ravel()
+        r = r.ravel()
+        keep = numpy.isfinite(c) & numpy.isfinite(r)
+        c = c[keep]
+        r = r[keep]
+
+        if 'color' in kwargs:
+            kwargs['edgecolor'] = kwargs.pop('color')
+        kwargs.setdefault('edgecolor', matplotlib.rcParams['patch.edgecolor'])
+
+        circ = collections.EllipseCollection(2*r, 2*r, numpy.zeros(len(r)), units='xy', offsets=numpy.column_stack((numpy.real(c), numpy.imag(c))),
+                                             offset_transform=self.axis.transData, facecolors='none', **kwargs)
+        self.axis.add_collection(circ, autolim=False)
+        if clip:
+            circ.set_clip_path(self.clip)
+
+        return circ
+
+    def plot_gain_circles(self, s, gain_db, port='input', clip=True, **kwargs):
+        """Plots constant available gain circles (port='input', source plane) or operating gain circles (port='output', load plane) for s parameters of shape (..., 2, 2).
+        gain_db broadcasts against the leading shape of s, see rfcircles.available_gain_circles."""
+        if port == 'input':
+            c, r = rfcircles.available_gain_circles(s, gain_db)
+        else:
+            c, r = rfcircles.operating_gain_circles(s, gain_db)
+        return self.plot_circles(c, r, clip=clip, **kwargs)
+
+    def plot_noise_circles(self, nfmin, gamma_opt, rn, nf, z0=50, clip=True, **kwargs):
+        """Plots constant noise figure circles in the source plane, see rfcircles.noise_circles."""
+        c, r = rfcircles.noise_circles(nfmin, gamma_opt, rn, nf, z0)
+        return self.plot_circles(c, r, clip=clip, **kwargs)
+
+    def plot_stability(self, s, port='input', clip=True, circles=True, region=False, resolution=201, region_kwargs=None, **kwargs):
+        """Plots the input or output stability circles of an (N, 2, 2) array of s parameters.
+        If circles, every circle that intersects the chart is drawn in a single EllipseCollection (kwargs are passed to it).
+        If region, the union of all unstable regions across frequency is computed on a resolution x resolution grid and drawn as one filled contour, styled by region_kwargs (passed to contourf).
+        Returns the circle collection and the region contour set (None when not drawn)."""
+        c, r, stable_outside = self.get_stability_circles(s, port)
+
+        circ = None
+        if circles:
+            # only draw circles which intersect with the smith chart (for cleaner view, and performance improvement)
+            visible = numpy.where(stable_outside, (numpy.abs(c) - r) <= 1, numpy.abs(numpy.abs(c) - r) <= 1)
+            circ = self.plot_circles(c[visible], r[visible], clip=clip, **kwargs)
+
+        fill = None
+        if region:
+            x, y = numpy.meshgrid(numpy.linspace(-1, 1, resolution), numpy.linspace(-1, 1, resolution))
+            field = self.get_unstable_field(c, r, stable_outside, x, y)
+
+            if numpy.min(field) < 0:
+                region_kwargs = dict(region_kwargs or {})
+                region_kwargs.setdefault('colors', 'tab:red')
+                region_kwargs.setdefault('alpha', 0.25)
+                region_kwargs.setdefault('zorder', 1)
+
+                fill = self.axis.contourf(x, y, field, levels=[numpy.min(field), 0], **region_kwargs)
+                # the region is always limited to the chart
+                fill.set_clip_path(self.clip)
+
+        return circ, fill
 
-            self.axis.add_patch(circ)
-            if clip:
-                circ.set_clip_path(self.clip)
+    def plot_input_stability(self, s, clip=True, **kwargs):
+        """Plots the input (source plane) stability circles, see plot_stability for the optional arguments."""
+        return self.plot_stability(s, 'input', clip=clip, **kwargs)
 
     def plot_output_stability(self, s, clip=True, **kwargs):
-        s11 = s[:, 0, 0]
-        s12 = s[:, 0, 1]
-        s21 = s[:, 1, 0]
-        s22 = s[:, 1, 1]
-
-        delta = s11*s22 - s12*s21
-
-        c = numpy.conj(s22 - delta*numpy.conj(s11))/(numpy.abs(s22)*numpy.abs(s22) - numpy.abs(delta)*numpy.abs(delta))
-        r = numpy.abs(s12*s21/(numpy.abs(s22)*numpy.abs(s22) - numpy.abs(delta)*numpy.abs(delta)))
-
-        # check if the center of the circle is a stable or unstable point
-        stable_outside = numpy.abs(s11 + s12*s21*c/(1-s22*c)) > 1
-
-        center_radii = zip(c, r, stable_outside)
-
-        for cl, rl, stable in center_radii:
-            # check if this cirle intersects with the smith chart (for cleaner view, and performance improvement)
-            if stable:
-                if (numpy.abs(cl) - rl) > 1:
-                    continue
-                # fill the cirlce as the region to avoid
-                circ = patches.Circle((numpy.real(cl), numpy.imag(cl)), rl, fill=False, **kwargs)
-            else:
-                if (numpy.abs(numpy.abs(cl) - rl) > 1):
-                    continue
-                circ = patches.Circle((numpy.real(cl), numpy.imag(cl)), rl, fill=False, **kwargs)
-
-            self.axis.add_patch(circ)
-            if clip:
-                circ.set_clip_path(self.clip)
-
-
-    def plot(self, s, dl=0.1, linewidth=2, arrowscale=16, **kwargs):
-        """Plots a REFLECTION COEFFICENT on the chart. Frequency parameter optional. The typical optional arguments to pyplot.plot can be used."""
+        """Plots the output (load plane) stability circles, see plot_stability for the optional arguments."""
+        return self.plot_stability(s, 'output', clip=clip, **kwargs)
+
+    @staticmethod
+    def get_arrow_positions(s, dl=0.1):
+        """Returns the positions and unit directions (both complex) of arrows placed every dl of accumulated distance along the trace s."""
+        s = numpy.asarray(s)
+        if len(s) < 2:
+            return numpy.zeros(0, dtype=complex), numpy.zeros(0, dtype=complex)
+
+        segments = numpy.diff(s)
+        lengths = numpy.abs(segments)
+        # gaps (segments touching a nan point) get zero length, so arrows skip over them
+        lengths[~numpy.isfinite(lengths)] = 0
+        distance = numpy.concatenate(([0], numpy.cumsum(lengths)))
+
+        # find the segment each arrow falls on, zero length segments are never selected
+        d = numpy.arange(dl, distance[-1], dl)
+        i = numpy.searchsorted(distance, d, side='right') - 1
+
+        direction = segments[i]/lengths[i]
+        return s[i] + direction*(d - distance[i]), direction
+
+    def add_arrows(self, position, direction, arrowscale=16, linewidth=2, color='black'):
+        """Draws '->' style arrow heads at the given positions (complex) pointing along direction (complex) as a single PathCollection.
+        arrowscale sets the arrow head size in points, as mutation_scale does for annotate."""
+        # the head shape of the '->' arrowstyle, in points
+        head_length = 0.4*arrowscale
+        head_width = 0.2*arrowscale
+
+        back = -head_length*direction
+        side = head_width*1j*direction
+        w = numpy.stack((back + side, numpy.zeros(len(direction)), back - side), axis=-1)
+        vertices = numpy.stack((numpy.real(w), numpy.imag(w)), axis=-1)
+
+        codes = [Path.MOVETO, Path.LINETO, Path.LINETO]
+        arrows = collections.PathCollection([Path(v, codes) for v in vertices], sizes=[1], offsets=numpy.column_stack((numpy.real(position), numpy.imag(position))),
+                                            offset_transform=self.axis.transData, facecolors='none', edgecolors=color, linewidths=linewidth, zorder=3)
+        # path vertices are in points (sizes of 1 scales points to pixels), while offsets are in data coordinates
+        arrows.set_transform(transforms.IdentityTransform())
+        self.axis.add_collection(arrows, autolim=False)
+        return arrows
+
+    @staticmethod
+    def decimate(s, xlim, ylim, resolution):
+        """Reduces the trace s to the points needed to draw it within xlim, ylim, with errors smaller than resolution (in reflection coefficient units).
+        The plane is divided into a grid of resolution sized cells and only the first and last points of every run of points inside one cell are kept.
+        Points outside of the view are removed, with nan inserted to break the line where they were."""
+        s = numpy.asarray(s, dtype=complex)
+        if len(s) < 3:
+            return s
+
+        x = numpy.real(s)
+        y = numpy.imag(s)
+
+        visible = (x >= xlim[0]) & (x <= xlim[1]) & (y >= ylim[0]) & (y <= ylim[1])
+        # keep the neighbours of visible points so lines leaving the view are still drawn up to its edge
+        near = visible.copy()
+        near[1:] |= visible[:-1]
+        near[:-1] |= visible[1:]
+
+        cx = numpy.floor(x/resolution)
+        cy = numpy.floor(y/resolution)
+        change = numpy.ones(len(s), dtype=bool)
+        change[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+
+        keep = change.copy()
+        keep[:-1] |= change[1:]
+        keep[-1] = True
+        keep &= near
+
+        i = numpy.flatnonzero(keep)
+        hidden = numpy.cumsum(~near)
+        gaps = numpy.flatnonzero(hidden[i[1:]] != hidden[i[:-1]]) + 1
+
+        return numpy.insert(s[i], gaps, numpy.nan)
+
+    def update_decimation(self):
+        """Re-decimates every trace plotted with decimate=True for the current view, this is called automatically when the axis limits change."""
+        xlim = self.axis.get_xlim()
+        ylim = self.axis.get_ylim()
+
+        # one cell per pixel across the larger side of the view
+        bbox = self.axis.get_window_extent()
+        pixels = max(bbox.width, bbox.height, 1)
+        resolution = max(xlim[1] - xlim[0], ylim[1] - ylim[0])/pixels
+
+        for line, trace in self.traces.items():
+            if trace['decimate']:
+                d = self.decimate(trace['s'], xlim, ylim, resolution)
+                line.set_data(numpy.real(d), numpy.imag(d))
+
+    def get_trace(self, line):
+        """Returns the full resolution data of a trace plotted on this chart, given the line returned by plot."""
+        if type(line) is list:
+            line = line[0]
+        return self.traces[line]['s']
+
+    def get_index(self, line):
+        """Returns the trace_index of a trace, building it if the trace is new or was changed by update_live."""
+        if type(line) is list:
+            line = line[0]
+        trace = self.traces[line]
+        if trace['index'] is None:
+            trace['index'] = trace_index(trace['s'])
+        return trace['index']
+
+    def nearest(self, x, y, radius=numpy.inf):
+        """Returns the line, point index and distance of the trace point nearest to (x, y) over every visible trace, or (None, None, inf) if there is none within radius."""
+        best = (None, None, numpy.inf)
+        for line in self.traces:
+            if line.axes is not self.axis or not line.get_visible():
+                continue
+            i, d = self.get_index(line).nearest(x, y, min(radius, best[2]))
+            if i is not None and d < best[2]:
+                best = (line, i, d)
+        return best
+
+    def plot(self, s, dl=0.1, linewidth=2, arrowscale=16, decimate=False, f=None, **kwargs):
+        """Plots a REFLECTION COEFFICENT on the chart. Frequency parameter optional (f is shown by the cursor, see enable_cursor). The typical optional arguments to pyplot.plot can be used.
+        If decimate is True, only the points needed to draw the trace at the current view are given to the line, and it is re-decimated whenever the view changes (the full data is kept, see get_trace)."""
+        s = numpy.asarray(s)
         p = self.axis.plot(numpy.real(s), numpy.imag(s), linewidth=linewidth, **kwargs)
+        self.traces[p[0]] = {'s': s, 'f': f, 'decimate': decimate, 'index': None}
 
-        # plot arrows based on an accumulated distance
-        sum = 0
-        for i in range(0, len(s)-1):
-            startx = numpy.real(s[i])
-            stopx  = numpy.real(s[i+1])
-            starty = numpy.imag(s[i])
-            stopy  = numpy.imag(s[i+1])
-
-            dist = numpy.sqrt((stopx - startx) * (stopx - startx) + (stopy - starty) * (stopy - starty))
-
-            if sum + dist > dl:
-                dx = stopx - startx
-                dy = stopy - starty    
-                l2norm = numpy.sqrt(dx*dx+dy*dy)
-                dx /= l2norm
-                dy /= l2norm
-
-                centerx = startx + dx*(dl - sum) 
-                centery = starty + dy*(dl - sum) 
-
-                dist -= dl - sum
-                sum = dl
-
-                while sum + dist > dl:
-                    self.axis.annotate("", 
-                            xytext=(
-                                centerx, 
-                                centery
-                                ), 
-                            xy=(
-                                centerx + 1e-10*dx, 
-                                centery + 1e-10*dy
-                                ), 
-                                arrowprops=dict(arrowstyle='->', mutation_scale=arrowscale, edgecolor=p[0].get_color(), linewidth=linewidth))
-                    
-                    centerx += dl*dx
-                    centery += dl*dy
-
-                    dist -= dl
-
-                sum += dist
-            else:
-                sum += dist
-
+        if decimate:
+            if not self.__decimation_connected:
+                # closures are held strongly by the callback registry, so this works even if the chart object is not kept
+                self.axis.callbacks.connect('xlim_changed', lambda ax: self.update_decimation())
+                self.axis.callbacks.connect('ylim_changed', lambda ax: self.update_decimation())
+                self.__decimation_connected = True
+            self.update_decimation()
 
+        # plot arrows based on an accumulated distance
+        position, direction = self.get_arrow_positions(s, dl)
+        self.add_arrows(position, direction, arrowscale=arrowscale, linewidth=linewidth, color=p[0].get_color())
+
+        return p
+
+    def add_live_trace(self, linewidth=2, f=None, **kwargs):
+        """Creates a persistent line for data which is updated in place with update_live (e.g. while tuning with the PNA).
+        Live lines are animated, so they are only drawn by update_live until stop_live is called. f is the frequency of the data, if known. Returns the line."""
+        p = self.axis.plot([], [], linewidth=linewidth, animated=True, **kwargs)
+        self.traces[p[0]] = {'s': numpy.zeros(0, dtype=complex), 'f': f, 'decimate': False, 'index': None}
+        self.__live.append(p[0])
+        self.__connect_draw()
+
+        return p[0]
+
+    def __connect_draw(self):
+        if self.__draw_cid is None:
+            self.__draw_cid = self.axis.figure.canvas.mpl_connect('draw_event', self.__on_draw)
+
+    def __on_draw(self, event):
+        # a full redraw happened (first draw, resize, zoom), cache the static chart then put the live lines back on top of it
+        canvas = self.axis.figure.canvas
+        if getattr(canvas, 'supports_blit', False):
+            self.__background = canvas.copy_from_bbox(self.axis.bbox)
+            self.__draw_live()
+
+    def __draw_live(self):
+        for line in self.__live + self.__cursor:
+            self.axis.draw_artist(line)
+
+    def __blit(self):
+        # redraws only the animated artists (live lines and the cursor) over the cached chart background
+        canvas = self.axis.figure.canvas
+        if self.__background is None:
+            # the draw event caches the background and draws the animated artists
+            canvas.draw()
+        else:
+            canvas.restore_region(self.__background)
+            self.__draw_live()
+        canvas.blit(self.axis.bbox)
+        canvas.flush_events()
+
+    def update_live(self, data):
+        """Updates live lines in place. data is a dictionary of line (from add_live_trace) to reflection coefficients.
+        Only the live lines are redrawn over the cached chart background when the canvas supports blitting."""
+        for line, s in data.items():
+            s = numpy.asarray(s)
+            line.set_data(numpy.real(s), numpy.imag(s))
+            self.traces[line]['s'] = s
+            # the cursor index is rebuilt for the new data on the next query
+            self.traces[line]['index'] = None
+
+        canvas = self.axis.figure.canvas
+        if not getattr(canvas, 'supports_blit', False):
+            canvas.draw_idle()
+            return
+
+        self.__blit()
+
+    def __live_reader(self, source, frames, stop):
+        while not stop.is_set():
+            data = source()
+            # only the newest frame is kept, so a slow display never falls behind the instrument
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                pass
+            frames.put(data)
+
+    def __live_timer(self, lines, frames):
+        try:
+            data = frames.get_nowait()
+        except queue.Empty:
+            return
+
+        if len(lines) == 1:
+            data = [data]
+        self.update_live(dict(zip(lines, data)))
+
+    def start_live(self, source, lines=None, interval=20):
+        """Starts streaming data into live lines. source is called repeatedly from a background thread and should return the reflection coefficients for one line,
+        or a list of them when several lines are given (e.g. source = lambda: pna.get_data('S11')[0]). The lines default to a new live trace.
+        The display is updated from the GUI thread every interval milliseconds with the newest data. Returns the live lines."""
+        if lines is None:
+            lines = [self.add_live_trace()]
+        elif type(lines) is not list:
+            lines = [lines]
+
+        self.stop_live(freeze=False)
+
+        frames = queue.Queue(maxsize=1)
+        self.__live_stop = threading.Event()
+        self.__live_thread = threading.Thread(target=self.__live_reader, args=(source, frames, self.__live_stop), daemon=True)
+        self.__live_thread.start()
+
+        self.__timer = self.axis.figure.canvas.new_timer(interval=interval)
+        self.__timer.add_callback(self.__live_timer, lines, frames)
+        self.__timer.start()
+
+        return lines
+
+    def stop_live(self, freeze=True):
+        """Stops streaming started with start_live. If freeze, the live lines become normal lines, so they show up in later redraws and when saving the figure."""
+        if self.__timer is not None:
+            self.__timer.stop()
+            self.__timer = None
+
+        if self.__live_thread is not None:
+            self.__live_stop.set()
+            self.__live_thread.join()
+            self.__live_thread = None
+
+        if freeze:
+            for line in self.__live:
+                line.set_animated(False)
+            self.__live = []
+            self.axis.figure.canvas.draw_idle()
+
+    @staticmethod
+    def get_cursor_text(s, f=None, i=None, z0=50):
+        """Returns the cursor label of a reflection coefficient s: its frequency f (or point number i), Z, Y and |gamma|."""
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            z = z0*(1 + s)/(1 - s)
+            y = 1/z
 
-    def __init__(self, ax, fontsize=8, clip_radius=1):
-        """Initializes a given axis as a smith chart."""
+        lines = []
+        if f is not None:
+            for unit, scale in (('GHz', 1e9), ('MHz', 1e6), ('kHz', 1e3), ('Hz', 1)):
+                if abs(f) >= scale or scale == 1:
+                    lines.append('f = ' + format(f/scale, '.6g') + ' ' + unit)
+                    break
+        elif i is not None:
+            lines.append('point ' + str(i))
+
+        lines.append('Z = ' + format(z.real, '.4g') + (' - j' if z.imag < 0 else ' + j') + format(abs(z.imag), '.4g') + ' \u03a9')
+        lines.append('Y = ' + format(1e3*y.real, '.4g') + (' - j' if y.imag < 0 else ' + j') + format(abs(1e3*y.imag), '.4g') + ' mS')
+        lines.append('|\u0393| = ' + format(abs(s), '.4f'))
+        return '\n'.join(lines)
+
+    def enable_cursor(self, z0=50, max_distance=20, fontsize=None):
+        """Shows the frequency, impedance, admittance and |gamma| of the trace point nearest the mouse, over every trace plotted on this chart.
+        Points further than max_distance pixels from the mouse are ignored. z0 is the reference impedance for Z and Y.
+        Each trace is searched with a trace_index, which is built on the first query and rebuilt only when update_live changes the trace."""
+        self.disable_cursor()
+        if fontsize is None:
+            fontsize = self.grid.fontsize
+
+        canvas = self.axis.figure.canvas
+        blit = getattr(canvas, 'supports_blit', False)
+        marker = self.axis.plot([], [], 'o', markersize=5, markerfacecolor='none', color='black', animated=blit, zorder=10)[0]
+        label = self.axis.annotate('', xy=(0, 0), xytext=(8, 8), textcoords='offset points', size=fontsize, animated=blit, zorder=10,
+                                   bbox=dict(boxstyle='round', facecolor='white', edgecolor='0.5', alpha=0.9))
+        marker.set_visible(False)
+        label.set_visible(False)
+        self.__cursor = [marker, label]
+
+        self.__cursor_z0 = z0
+        self.__cursor_distance = max_distance
+        self.__cursor_cid = canvas.mpl_connect('motion_notify_event', self.__on_motion)
+        if blit:
+            self.__connect_draw()
+
+    def disable_cursor(self):
+        """Removes the cursor added by enable_cursor."""
+        if self.__cursor_cid is None:
+            return
+
+        self.axis.figure.canvas.mpl_disconnect(self.__cursor_cid)
+        self.__cursor_cid = None
+        for a in self.__cursor:
+            a.remove()
+        self.__cursor = []
+        self.axis.figure.canvas.draw_idle()
+
+    def __on_motion(self, event):
+        marker, label = self.__cursor
+
+        line = None
+        if event.inaxes is self.axis:
+            # max_distance in data units, the axis has an equal aspect ratio
+            scale = numpy.abs(numpy.diff(self.axis.transData.transform([(0, 0), (1, 0)])[:, 0]))[0]
+            line, i, d = self.nearest(event.xdata, event.ydata, self.__cursor_distance/scale)
+
+        if line is None:
+            if not marker.get_visible():
+                return
+            marker.set_visible(False)
+            label.set_visible(False)
+        else:
+            trace = self.traces[line]
+            s = complex(trace['s'][i])
+            f = trace['f']
+            f = None if f is None or numpy.size(f) != len(trace['s']) else f[i]
+
+            marker.set_data([s.real], [s.imag])
+            marker.set_color(line.get_color())
+            label.xy = (s.real, s.imag)
+            label.set_text(self.get_cursor_text(s, f, i, self.__cursor_z0))
+            # keep the label towards the center of the chart
+            label.set_position((-8 if s.real > 0 else 8, -8 if s.imag > 0 else 8))
+            label.set_horizontalalignment('right' if s.real > 0 else 'left')
+            label.set_verticalalignment('top' if s.imag > 0 else 'bottom')
+            marker.set_visible(True)
+            label.set_visible(True)
+
+        if marker.get_animated():
+            self.__blit()
+        else:
+            self.axis.figure.canvas.draw_idle()
+
+    def __init__(self, ax, fontsize=8, clip_radius=1, grid=None, raster=False):
+        """Initializes a given axis as a smith chart. The grid is stamped from a precomputed jdsmith_grid, by default the memoized one from get_grid(fontsize=fontsize, clip_radius=clip_radius).
+        If raster is True, the grid lines are drawn as a cached image instead of vector lines (see jdsmith_grid.stamp)."""
         self.axis = ax
-        # create the smith chart grid regions, see add_smith_region for details
-        self.add_smith_region((-1, 1), (0, 1), dr=0.1, dx=0.1)
-        self.add_smith_region((-2, 2), (0, 2), dr=0.2, dx=0.2)
-        self.add_smith_region((-5, 5), (0, 5), dr=1, dx=1)
-        self.add_smith_region((-10, 10), (0, 10), dr=5, dx=5)
 
-        # finish off the RHS of the smith chart with some final constant resistance circles
-        self.add_constant_resistance([(10, -1e6, 1e6)])
-        self.add_constant_admittance([(10, 0, 1e6)])
-        self.add_constant_admittance([(-10, 0, 1e6)])
+        # full resolution data of every plotted trace, keyed by its line
+        self.traces = {}
+        self.__decimation_connected = False
 
-        # add the real axis
-        self.axis.hlines(0, -1, 1, color='black', linewidth=0.5)
+        # live update state, see add_live_trace and start_live
+        self.__live = []
+        self.__background = None
+        self.__draw_cid = None
+        self.__timer = None
+        self.__live_thread = None
 
-        # finally, add the outer circular boundary
-        boundary = patches.Circle((0, 0), 1, edgecolor='black', fill=False, linewidth=1)
-        self.axis.add_patch(boundary)
+        # cursor state, see enable_cursor
+        self.__cursor = []
+        self.__cursor_cid = None
 
-        # major impedance lables
-        self.add_impedance_labels(numpy.asarray((0.2+1j*0 ,0.4+1j*0 ,0.6+1j*0 ,0.8+1j*0 ,1+1j*0, 2+1j*0, 3+1j*0, 5+1j*0, 10+1j*0)), rule='real', rotation=0, size=fontsize)
-        self.add_impedance_labels(numpy.asarray((0.2*1j ,0.4*1j ,0.6*1j ,0.8*1j, 1*1j, 2*1j, 3*1j, 4*1j, 5*1j, 10*1j)), rule='imag', size=fontsize)
-        self.add_impedance_labels(-numpy.asarray((0.2*1j ,0.4*1j ,0.6*1j ,0.8*1j, 1*1j, 2*1j, 3*1j, 4*1j, 5*1j, 10*1j)), rule='imag', size=fontsize)
+        if grid is None:
+            grid = get_grid(fontsize=fontsize, clip_radius=clip_radius)
+        self.grid = grid
+        self.grid.stamp(self.axis, raster=raster)
 
         # initial boundaries, can be modified later
         self.axis.set_ylim(-1.01, 1.01)
@@ -281,11 +651,157 @@ class jdsmith:
         self.axis.axis(False)
 
         # create a clip path to hide everything outside of a circle (for things like stability circles)
-        self.clip = patches.Circle((0, 0), clip_radius, linewidth=0, fill=False)
+        self.clip = patches.Circle((0, 0), self.grid.clip_radius, linewidth=0, fill=False)
         self.axis.add_artist(self.clip)
 
         # self.axis.set_clip_path(self.clip)
 
 
+class jdsmith_grid:
+    """A smith chart grid (arc vertices and label positions) computed once and stamped onto any number of axes.
+    Use get_grid to get a shared instance for a given configuration instead of creating these directly."""
+
+    def __init__(self, regions=default_regions, fontsize=8, clip_radius=1):
+        self.regions = regions
+        self.fontsize = fontsize
+        self.clip_radius = clip_radius
+
+        # create the smith chart grid regions, see add_smith_region for details
+        self.region_vertices = [jdsmith.get_smith_region_vertices(*r) for r in regions]
+
+        # finish off the RHS of the smith chart with some final constant resistance circles
+        self.outer_vertices = numpy.concatenate((
+            jdsmith.get_constant_resistance_vertices([(10, -1e6, 1e6)]),
+            jdsmith.get_constant_admittance_vertices([(10, 0, 1e6), (-10, 0, 1e6)])
+        ))
+
+        # major impedance lables
+        real = numpy.asarray(default_real_labels) + 0j
+        imag = 1j*numpy.asarray(default_imag_labels)
+        self.labels = jdsmith.get_impedance_labels(real, rule='real', rotation=0) + jdsmith.get_impedance_labels(imag, rule='imag') + jdsmith.get_impedance_labels(-imag, rule='imag')
+
+        self.__backgrounds = {}
 
+    def add_lines(self, ax):
+        """Adds the grid lines, real axis and outer boundary to an axis as vector artists."""
+        for v in self.region_vertices:
+            ax.add_collection(grid_collection(v))
+        ax.add_collection(grid_collection(self.outer_vertices))
 
+        # add the real axis
+        ax.hlines(0, -1, 1, color='black', linewidth=0.5)
+
+        # finally, add the outer circular boundary
+        boundary = patches.Circle((0, 0), 1, edgecolor='black', fill=False, linewidth=1)
+        ax.add_patch(boundary)
+
+    def get_background(self, size):
+        """Returns the grid lines rendered into a (size, size, 4) RGBA image spanning [-1.01, 1.01] in both directions. Images are cached per size."""
+        size = int(size)
+        if size not in self.__backgrounds:
+            fig = Figure(figsize=(1, 1), dpi=size)
+            canvas = FigureCanvasAgg(fig)
+            fig.patch.set_alpha(0)
+
+            ax = fig.add_axes((0, 0, 1, 1))
+            self.add_lines(ax)
+            ax.set_ylim(-1.01, 1.01)
+            ax.set_xlim(-1.01, 1.01)
+            ax.axis(False)
+
+            canvas.draw()
+            self.__backgrounds[size] = numpy.asarray(canvas.buffer_rgba()).copy()
+
+        return self.__backgrounds[size]
+
+    def stamp(self, ax, raster=False):
+        """Draws the grid and labels onto an axis. If raster is True, the grid lines are drawn as a single cached image sized to the axis (faster to draw and save, but it will blur when zoomed in)."""
+        if raster:
+            bbox = ax.get_window_extent()
+            size = max(1, int(numpy.ceil(min(bbox.width, bbox.height))))
+            ax.imshow(self.get_background(size), extent=(-1.01, 1.01, -1.01, 1.01), zorder=1)
+        else:
+            self.add_lines(ax)
+
+        for text, xy, text_rot, ha in self.labels:
+            ax.annotate(text, xy=xy, size=self.fontsize, rotation_mode='anchor', rotation=text_rot, ha=ha, va='bottom')
+
+
+@functools.lru_cache(maxsize=None)
+def get_grid(regions=default_regions, fontsize=8, clip_radius=1):
+    """Returns the jdsmith_grid for a configuration, computing it only the first time it is requested. regions must be a tuple of tuples so that it can be hashed."""
+    return jdsmith_grid(regions, fontsize=fontsize, clip_radius=clip_radius)
+
+
+class trace_index:
+    """A hashed grid over the points of a trace for nearest point queries, which only look at the few cells around the query point.
+    The grid has about len(s)/points_per_cell cells, but only the occupied ones are stored."""
+    def __init__(self, s, points_per_cell=16):
+        s = numpy.asarray(s, dtype=complex).ravel()
+        self.points = numpy.flatnonzero(numpy.isfinite(s))
+        self.x = numpy.real(s[self.points])
+        self.y = numpy.imag(s[self.points])
+        if len(self.points) == 0:
+            return
+
+        self.x0 = self.x.min()
+        self.y0 = self.y.min()
+        span = max(self.x.max() - self.x0, self.y.max() - self.y0, 1e-12)
+        self.size = span*numpy.sqrt(points_per_cell/len(self.points))
+        self.cells = int(span/self.size) + 1
+
+        # points sorted by cell, with keys the sorted occupied cell ids and starts/ends the range of each cell in order
+        cell = numpy.floor((self.y - self.y0)/self.size).astype(numpy.int64)*self.cells + numpy.floor((self.x - self.x0)/self.size).astype(numpy.int64)
+        self.order = numpy.argsort(cell, kind='stable')
+        self.keys, self.starts = numpy.unique(cell[self.order], return_index=True)
+        self.ends = numpy.append(self.starts[1:], len(cell))
+
+    def __window(self, cx, cy, w):
+        # points in the occupied cells of the square window w cells either side of (cx, cy)
+        i = numpy.arange(max(cx - w, 0), min(cx + w, self.cells - 1) + 1)
+        j = numpy.arange(max(cy - w, 0), min(cy + w, self.cells - 1) + 1)
+        cells = (j[:, None]*self.cells + i[None, :]).ravel()
+
+        found = numpy.searchsorted(self.keys, cells)
+        valid = found < len(self.keys)
+        found = found[valid]
+        found = found[self.keys[found] == cells[valid]]
+
+        # concatenated ranges of every occupied cell
+        starts = self.starts[found]
+        counts = self.ends[found] - starts
+        offsets = numpy.cumsum(counts) - counts
+        return self.order[numpy.repeat(starts - offsets, counts) + numpy.arange(numpy.sum(counts))]
+
+    def nearest(self, x, y, radius=numpy.inf):
+        """Returns the index (into the s given to the constructor) of the point nearest to (x, y) and its distance, or (None, inf) if there is no point within radius."""
+        if len(self.points) == 0:
+            return None, numpy.inf
+
+        cx = int(numpy.floor((x - self.x0)/self.size))
+        cy = int(numpy.floor((y - self.y0)/self.size))
+
+        # search square windows of cells around the query, doubling their size until the nearest point found is closer than anything outside of the window
+        w = 1
+        while True:
+            # once the window covers more cells than there are points, all points are simply checked
+            if (2*w + 1)**2 > len(self.points):
+                i = numpy.arange(len(self.points))
+            else:
+                i = self.__window(cx, cy, w)
+
+            if len(i):
+                d = numpy.hypot(self.x[i] - x, self.y[i] - y)
+                best = numpy.argmin(d)
+                distance = d[best]
+                # points outside of the window are at least w cells away from the query
+                if distance <= w*self.size or len(i) == len(self.points):
+                    break
+            # the window only needs to reach the radius
+            if w*self.size >= radius:
+                return None, numpy.inf
+            w *= 2
+
+        if distance > radius:
+            return None, numpy.inf
+        return self.points[i[best]], distance
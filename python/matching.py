@@ -0,0 +1,223 @@
+import itertools
+from collections import namedtuple
+
+import numpy
+
+# Impedance matching network search.
+# A topology is a tuple of elements listed from the source towards the load. Each element is (placement, kind) or (placement, kind, fixed value), where
+# placement is 'series' or 'shunt' and kind is 'L' (henries), 'C' (farads), 'line' (series transmission line), or 'open' / 'short' (shunt stubs).
+# Line and stub values are electrical lengths in degrees at the band center.
+
+# topology is the element tuple, values the value of each element, worst the largest in band |gamma|, and f and gamma the in band frequencies and input reflection coefficients
+candidate = namedtuple('candidate', ['topology', 'values', 'worst', 'f', 'gamma'])
+
+
+def _lumped(*placements):
+    return [tuple(zip(placements, kinds)) for kinds in itertools.product('LC', repeat=len(placements))]
+
+
+families = {
+    'L': _lumped('series', 'shunt') + _lumped('shunt', 'series'),
+    'pi': _lumped('shunt', 'series', 'shunt'),
+    'T': _lumped('series', 'shunt', 'series'),
+    'single_stub': [(('shunt', stub), ('series', 'line')) for stub in ('open', 'short')],
+    # stubs spaced by an eighth of a wavelength, the second stub sits at the load
+    'double_stub': [(('shunt', a), ('series', 'line', 45), ('shunt', b)) for a, b in itertools.product(('open', 'short'), repeat=2)],
+}
+
+
+def impedance(gamma, z0=50):
+    """Converts reflection coefficients (e.g. s[:, 0, 0] of a load) into impedances."""
+    gamma = numpy.asarray(gamma)
+    return z0*(1 + gamma)/(1 - gamma)
+
+
+def default_values(kind, f0, z0, n):
+    """Returns the default search grid for an element kind. Lumped elements span reactances from z0/20 to 20*z0 at f0, lines and stubs span (0, 180) degrees."""
+    w0 = 2*numpy.pi*f0
+    if kind == 'L':
+        return numpy.logspace(numpy.log10(z0/20/w0), numpy.log10(20*z0/w0), n)
+    elif kind == 'C':
+        return numpy.logspace(numpy.log10(1/(20*z0*w0)), numpy.log10(20/(z0*w0)), n)
+    elif kind in ('line', 'open', 'short'):
+        return numpy.linspace(0, 180, n + 2)[1:-1]
+    else:
+        raise ValueError("Unknown element kind " + str(kind) + ".")
+
+
+def element_impedance(kind, value, f, f0, z0=50):
+    """Returns the impedance of a lumped element or stub. value and f broadcast."""
+    if kind == 'L':
+        return 1j*2*numpy.pi*f*value
+    elif kind == 'C':
+        return 1/(1j*2*numpy.pi*f*value)
+
+    t = numpy.tan(numpy.deg2rad(value)*f/f0)
+    if kind == 'open':
+        return z0/(1j*t)
+    elif kind == 'short':
+        return 1j*z0*t
+    else:
+        raise ValueError("Element kind " + str(kind) + " has no lumped impedance.")
+
+
+def evaluate(topology, values, f, zl, f0, z0=50):
+    """Returns the input reflection coefficient of a topology terminated by the load zl (over f).
+    values is an array of shape (combinations, elements), and the result has shape (combinations, len(f))."""
+    f = numpy.asarray(f, dtype=float)
+    values = numpy.asarray(values, dtype=float)
+    z = numpy.broadcast_to(numpy.asarray(zl, dtype=complex), (len(values), len(f)))
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # work from the load back towards the source
+        for k in reversed(range(len(topology))):
+            placement, kind = topology[k][:2]
+            v = values[:, k, None]
+
+            if kind == 'line':
+                t = numpy.tan(numpy.deg2rad(v)*f/f0)
+                z = z0*(z + 1j*z0*t)/(z0 + 1j*z*t)
+            elif placement == 'series':
+                z = z + element_impedance(kind, v, f, f0, z0)
+            else:
+                z = 1/(1/z + 1/element_impedance(kind, v, f, f0, z0))
+
+        return (z - z0)/(z + z0)
+
+
+def _steps(topology, grids):
+    # grid spacing of each element, as a ratio for the logarithmic lumped grids and in degrees for lines and stubs (0 for fixed elements)
+    steps = []
+    for e, g in zip(topology, grids):
+        if len(g) < 2:
+            steps.append(0)
+        elif e[1] in ('L', 'C'):
+            steps.append(numpy.log(g[1]/g[0]))
+        else:
+            steps.append(g[1] - g[0])
+    return steps
+
+
+def _refine_grids(topology, v, steps, points):
+    # a finer grid spanning one coarse step either side of each value
+    grids = []
+    for e, x, step in zip(topology, v, steps):
+        if step == 0:
+            grids.append(numpy.asarray([x]))
+        elif e[1] in ('L', 'C'):
+            grids.append(x*numpy.exp(step*numpy.linspace(-1, 1, points)))
+        else:
+            grids.append(numpy.clip(x + step*numpy.linspace(-1, 1, points), 1e-3, 180 - 1e-3))
+    return grids
+
+
+def _best(topology, grids, fb, zb, f0, z0, count, chunk):
+    combinations = numpy.stack(numpy.meshgrid(*grids, indexing='ij'), axis=-1).reshape(-1, len(topology))
+
+    best = []
+    # combinations are evaluated in chunks to bound the memory of the (combinations, frequencies) arrays
+    for i in range(0, len(combinations), chunk):
+        v = combinations[i:i+chunk]
+        gamma = evaluate(topology, v, fb, zb, f0, z0)
+        worst = numpy.max(numpy.abs(gamma), axis=1)
+        worst = numpy.where(numpy.isfinite(worst), worst, numpy.inf)
+
+        keep = numpy.argsort(worst)[:count]
+        best += [candidate(topology, tuple(v[j]), worst[j], fb, gamma[j]) for j in keep]
+
+    return sorted(best, key=lambda c: c.worst)[:count]
+
+
+def search(f, zl, band, families_or_topologies=('L', 'pi', 'T', 'single_stub', 'double_stub'), z0=50, count=10, budget=32768, values=None, refine=3, chunk=16384):
+    """Searches every topology over a grid of element values and returns the count best candidates, ranked by the worst |gamma| in band.
+
+    f and zl are the frequency and the complex load impedance, a scalar for a constant load (see impedance to convert from reflection coefficients), and band is (fstart, fstop).
+    families_or_topologies may contain keys of families and/or explicit topology tuples.
+    Each topology is searched over about budget combinations, split evenly between its elements. values optionally maps element kinds to custom grids.
+    The best candidates of each topology are then refined refine times on finer grids around their values."""
+    f = numpy.asarray(f, dtype=float)
+    # a constant load may be given as a scalar
+    zl = numpy.broadcast_to(numpy.asarray(zl, dtype=complex), f.shape)
+
+    inband = (f >= band[0]) & (f <= band[1])
+    if not numpy.any(inband):
+        raise ValueError("No frequencies in the band " + str(band) + ".")
+    fb = f[inband]
+    zb = zl[inband]
+    f0 = (band[0] + band[1])/2
+
+    topologies = []
+    for t in families_or_topologies:
+        if type(t) is str:
+            topologies += families[t]
+        else:
+            topologies.append(t)
+
+    best = []
+    for topology in topologies:
+        free = [e for e in topology if len(e) < 3]
+        n = max(2, int(budget**(1/max(len(free), 1))))
+
+        grids = []
+        for e in topology:
+            if len(e) >= 3:
+                grids.append(numpy.asarray([e[2]], dtype=float))
+            elif values is not None and e[1] in values:
+                grids.append(numpy.asarray(values[e[1]], dtype=float))
+            else:
+                grids.append(default_values(e[1], f0, z0, n))
+
+        found = _best(topology, grids, fb, zb, f0, z0, count, chunk)
+
+        # each refinement spans one step either side of the value with points values, so the step shrinks by (points - 1)/2 every pass
+        points = 9 if len(free) <= 2 else 5
+        steps = _steps(topology, grids)
+        for r in range(refine):
+            # each candidate is replaced by the best value on its finer grid, which is never worse as the grid includes the candidate
+            found = [_best(topology, _refine_grids(topology, c.values, steps, points), fb, zb, f0, z0, 1, chunk)[0] for c in found]
+            steps = [2*step/(points - 1) for step in steps]
+
+        # neighbouring coarse candidates often refine to the same values
+        unique = {}
+        for c in sorted(found, key=lambda c: c.worst):
+            unique.setdefault(tuple(float('%.3g' % v) for v in c.values), c)
+        found = list(unique.values())
+
+        best = sorted(best + found, key=lambda c: c.worst)[:count]
+
+    return best
+
+
+def trajectory(match, zl0, f0, z0=50, points=51):
+    """Returns the path of the impedance on the smith chart as each element of a candidate is added at f0, one reflection coefficient array per element starting from the load zl0.
+    Series elements move along constant resistance circles, shunt elements along constant conductance circles, and lines around the center of the chart."""
+    z = complex(zl0)
+    t = numpy.linspace(0, 1, points)
+    paths = []
+
+    for k in reversed(range(len(match.topology))):
+        placement, kind = match.topology[k][:2]
+        v = match.values[k]
+
+        if kind == 'line':
+            tt = numpy.tan(numpy.deg2rad(v)*t)
+            path = z0*(z + 1j*z0*tt)/(z0 + 1j*z*tt)
+        elif placement == 'series':
+            path = z + t*element_impedance(kind, v, f0, f0, z0)
+        else:
+            path = 1/(1/z + t/element_impedance(kind, v, f0, f0, z0))
+
+        paths.append((path - z0)/(path + z0))
+        z = path[-1]
+
+    return paths
+
+
+def plot(smith, match, zl0, f0, z0=50, **kwargs):
+    """Draws the trajectory of a candidate on a jdsmith chart, with arrows showing the direction each element moves the impedance. kwargs are passed to jdsmith.plot."""
+    lines = []
+    for path in trajectory(match, zl0, f0, z0):
+        lines += smith.plot(path, **kwargs)
+        # every element of the candidate gets the same color
+        kwargs.setdefault('color', lines[0].get_color())
+    return lines
@@ -0,0 +1,304 @@
+import hashlib
+import os
+import pickle
+import time
+
+import numpy
+
+# measurements that are memoized by default, per inst.py class
+default_methods = {
+    'PNA_E8364B': ('get_data',),
+    'PSA_E4448A': ('get_noise_figure',),
+    'NoiseFigure_8970B': ('meas_gain_nf', 'meas_temp', 'meas_hot_cold'),
+}
+
+def _e3649a_outputs(resource):
+    # VOLT? and CURR? only read the selected output, so each output is selected in turn and the selection is restored
+    selected = resource.query('INST:NSEL?').strip()
+    outputs = []
+    for n in ('1', '2'):
+        resource.write('INST:NSEL ' + n)
+        outputs.append((resource.query('VOLT?').strip(), resource.query('CURR?').strip()))
+    resource.write('INST:NSEL ' + selected)
+    return tuple(outputs)
+
+
+def _pna_segments(resource):
+    # the segment table, read segment by segment, in segment sweeps only
+    if not resource.query('SENS:SWE:TYPE?').strip().upper().startswith('SEGM'):
+        return ()
+    segments = []
+    for n in range(1, int(resource.query('SENS:SEGM:COUN?')) + 1):
+        segment = 'SENS:SEGM' + str(n) + ':'
+        segments.append(tuple(resource.query(segment + q).strip() for q in ('STAT?', 'FREQ:STAR?', 'FREQ:STOP?', 'SWE:POIN?', 'BWID?', 'POW?')))
+    return tuple(segments)
+
+
+# settings read from the instrument for every key, so a setup made before wrapping (or on the front panel) is part of the key. Queries are cheap next to a measurement.
+# Each query is a query string, or a function of the VISA resource for state that takes more than one query
+default_queries = {
+    'PNA_E8364B': ('SENS:FREQ:STAR?', 'SENS:FREQ:STOP?', 'SENS:SWE:POIN?', 'SENS:SWE:TYPE?', 'SENS:BWID?', 'SENS:AVER:STAT?', 'SENS:AVER:COUN?', 'SOUR:POW?',
+                   'SENS:SEGM:BWID:CONT?', 'SENS:SEGM:POW:CONT?', _pna_segments),
+    'PSA_E4448A': (':SENS:NFIG:FREQ:STAR?', ':SENS:NFIG:FREQ:STOP?', ':SENS:NFIG:SWE:POIN?', ':SENS:NFIG:CORR:ENR:MODE?', ':SENS:NFIG:CORR:ENR:COMM?',
+                   ':SENS:NFIG:CORR:ENR:SPOT?', ':SENS:NFIG:CORR:ENR:TABL:DATA?', ':SENS:NFIG:CORR:ENR:CAL:TABL:DATA?'),
+    'DC_E3649A': ('OUTP:STAT?', _e3649a_outputs),
+    'DC_6033A': ('VSET?', 'ISET?'),
+}
+
+
+def _is_number(header):
+    try:
+        float(header)
+        return True
+    except ValueError:
+        return False
+
+
+# calls whose effect cannot be read back from the instrument, so results are only cached once they have been made through the wrapped driver (and are then part of the key).
+# The 8970B ENR table and calibration are not readable over GPIB
+default_required = {
+    'NoiseFigure_8970B': ('load_enr', 'start_cal'),
+}
+
+# commands which reset recorded settings, mapped to a test of the headers they clear. ND resets the 8970B ENR table, whose entries are recorded under their frequency
+default_resets = {
+    'NoiseFigure_8970B': {'ND': _is_number},
+}
+
+# commands which select a channel or output, the settings written after them are recorded per selection so the settings of one output do not replace those of another
+default_selects = {
+    'DC_E3649A': ('INST:SEL', 'INST:NSEL'),
+}
+
+# calls which start a (slow) measurement whose result is read by a memoized method. They are only run when that method is not found in the cache
+default_deferred = {
+    'PSA_E4448A': ('init_nf_meas',),
+}
+
+
+def _fingerprint(value):
+    # a stable text representation of arguments and settings for hashing (arrays are hashed as their full data, which repr would truncate)
+    if isinstance(value, numpy.ndarray):
+        return 'array(' + str(value.dtype) + str(value.shape) + hashlib.sha1(numpy.ascontiguousarray(value).tobytes()).hexdigest() + ')'
+    elif isinstance(value, (list, tuple)):
+        return type(value).__name__ + '(' + ','.join(_fingerprint(v) for v in value) + ')'
+    elif isinstance(value, dict):
+        return 'dict(' + ','.join(_fingerprint(k) + ':' + _fingerprint(value[k]) for k in sorted(value, key=repr)) + ')'
+    elif isinstance(value, CachedInstrument):
+        return 'instrument(' + _fingerprint(value.get_state()) + ')'
+    return repr(value)
+
+
+class _Recorder:
+    """Stands in for the VISA resource of a driver, forwarding everything while recording the settings written to the instrument.
+    resets maps commands to a test of the recorded headers they clear (see default_resets), and selects are the headers of commands which select an output (see default_selects)."""
+    def __init__(self, resource, resets, selects):
+        self.resource = resource
+        self.resets = resets
+        self.selects = selects
+        self.selected = ''
+        self.recording = True
+        # header (after the selected output, if any) -> last command with that header, so re-sending a setting does not change the state
+        self.settings = {}
+
+    def write(self, command, *args, **kwargs):
+        if self.recording:
+            for c in command.split(';'):
+                c = c.strip().lstrip(':')
+                if c and '?' not in c:
+                    header = c.split(' ', 1)[0].upper()
+                    if header in self.resets:
+                        for h in [h for h in self.settings if self.resets[header](h)]:
+                            del self.settings[h]
+                    if header in self.selects:
+                        self.selected = c[len(header):].strip().upper() + ' '
+                        self.settings[header] = c
+                    else:
+                        self.settings[self.selected + header] = c
+        return self.resource.write(command, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        if name in ('resource', 'resets', 'selects', 'selected', 'recording', 'settings'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.resource, name, value)
+
+
+class CachedInstrument:
+    """A proxy of an inst.py driver, created by MeasurementCache.wrap. Every attribute is the driver's, except that memoized methods are looked up in the cache first
+    and deferred methods only run when a memoized method is not found. Until every required call has been made, memoized methods measure without the cache."""
+    def __init__(self, cache, instrument, dut, depends, methods, deferred, queries, required, resets, selects, max_age):
+        self.cache = cache
+        self.instrument = instrument
+        self.dut = dut
+        self.depends = depends
+        self.methods = methods
+        self.deferred = deferred
+        self.queries = queries
+        self.required = required
+        self.max_age = max_age
+
+        # the driver writes through the recorder from now on
+        self.recorder = _Recorder(instrument.inst, resets, selects)
+        instrument.inst = self.recorder
+
+        # deferred calls not run yet, and every deferred and required call made (which is part of the state, as it sets up the measurement)
+        self.pending = []
+        self.calls = {}
+
+    def get_state(self):
+        """Returns the settings read from the instrument with the queries, the settings written to it since it was wrapped and the deferred calls made,
+        which with the DUT and depends are the key of every memoized result."""
+        resource = self.recorder.resource
+        queried = {}
+        for q in self.queries:
+            if callable(q):
+                queried[q.__name__] = q(resource)
+            else:
+                queried[q] = resource.query(q).strip()
+        return {'queried': queried, 'settings': dict(self.recorder.settings), 'calls': dict(self.calls)}
+
+    def get_key(self, name, args, kwargs):
+        """Returns the cache key of a memoized call with the current state."""
+        text = _fingerprint((type(self.instrument).__name__, name, args, kwargs, self.get_state(), self.dut, self.depends))
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def __measure(self, name, args, kwargs):
+        # the measurement itself is not part of the setup
+        self.recorder.recording = False
+        try:
+            for call, call_args, call_kwargs in self.pending:
+                getattr(self.instrument, call)(*call_args, **call_kwargs)
+            self.pending = []
+            return getattr(self.instrument, name)(*args, **kwargs)
+        finally:
+            self.recorder.recording = True
+
+    def __memoized(self, name, *args, **kwargs):
+        if any(r not in self.calls for r in self.required):
+            return self.__measure(name, args, kwargs)
+
+        key = self.get_key(name, args, kwargs)
+        found, value = self.cache.load(key, self.max_age)
+        if found:
+            # the deferred calls set up the measurement that was found, they are not needed any more
+            self.pending = []
+            return value
+
+        value = self.__measure(name, args, kwargs)
+        self.cache.store(key, value)
+        return value
+
+    def __require(self, name, *args, **kwargs):
+        self.calls[name] = (args, kwargs)
+        return getattr(self.instrument, name)(*args, **kwargs)
+
+    def __defer(self, name, *args, **kwargs):
+        # only the latest call of each deferred method is run, a later one replaces the setup of an earlier one
+        self.pending = [p for p in self.pending if p[0] != name]
+        self.pending.append((name, args, kwargs))
+        self.calls[name] = (args, kwargs)
+
+    def __getattr__(self, name):
+        if name in self.methods:
+            return lambda *args, **kwargs: self.__memoized(name, *args, **kwargs)
+        if name in self.deferred:
+            return lambda *args, **kwargs: self.__defer(name, *args, **kwargs)
+        if name in self.required:
+            return lambda *args, **kwargs: self.__require(name, *args, **kwargs)
+        return getattr(self.instrument, name)
+
+
+class MeasurementCache:
+    """An opt-in, on disk cache of measurement results, so re-running a script on an unchanged setup does not measure everything again.
+
+    cache = measurecache.MeasurementCache('./cache', max_bytes=1e9, max_age=7*24*3600)
+    pna = cache.wrap(inst.PNA_E8364B('GPIB0::16::INSTR'), dut='lna_sn12')
+
+    Results are keyed by the method and its arguments, the settings read from the instrument (default_queries), every setting written to it since it was wrapped,
+    the DUT identity and any depends (values or other wrapped instruments, e.g. bias supplies).
+    Setup that cannot be read back (default_required, e.g. the 8970B ENR table and calibration) must be done through the wrapped driver before results are cached.
+    Entries are pickle files in directory. The least recently used are removed when the directory is larger than max_bytes, and entries older than max_age seconds are measured again."""
+
+    def __init__(self, directory, max_bytes=1e9, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def wrap(self, instrument, dut=None, depends=(), methods=None, deferred=None, queries=None, required=None, max_age=None):
+        """Returns a proxy of an inst.py driver whose measurements are cached. methods, deferred, queries and required default to default_methods, default_deferred, default_queries
+        and default_required for the driver class (queries are query strings or functions of the VISA resource).
+        max_age overrides the validity window of the cache for this instrument. The driver itself should not be used directly after it is wrapped."""
+        name = type(instrument).__name__
+        if methods is None:
+            methods = default_methods.get(name, ())
+        if deferred is None:
+            deferred = default_deferred.get(name, ())
+        if queries is None:
+            queries = default_queries.get(name, ())
+        if required is None:
+            required = default_required.get(name, ())
+        if max_age is None:
+            max_age = self.max_age
+
+        return CachedInstrument(self, instrument, dut, tuple(depends), tuple(methods), tuple(deferred), tuple(queries), tuple(required), default_resets.get(name, {}),
+                                default_selects.get(name, ()), max_age)
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def load(self, key, max_age=None):
+        """Returns (True, value) for a valid entry, or (False, None)."""
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                created, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+
+        if max_age is not None and time.time() - created > max_age:
+            os.remove(path)
+            self.misses += 1
+            return False, None
+
+        # the modification time is the last use, for the LRU eviction
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    def store(self, key, value):
+        path = self.__path(key)
+        temp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp, 'wb') as f:
+            pickle.dump((time.time(), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for e in os.scandir(self.directory):
+            if e.name.endswith('.pkl'):
+                stat = e.stat()
+                entries.append((stat.st_mtime, stat.st_size, e.path))
+                total += stat.st_size
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes every entry."""
+        for e in os.scandir(self.directory):
+            if e.name.endswith('.pkl'):
+                os.remove(e.path)
@@ -0,0 +1,136 @@
+import functools
+
+import numpy
+
+# Microstrip analysis and synthesis, ported from matlab/char_impedance_microstrip.m.
+# w is the strip width, d the substrate thickness (same units) and er the relative permittivity of the substrate. f is in Hz and d must be in meters where f is used.
+# Every function broadcasts its arguments, so whole design spaces (e.g. widths x thicknesses x permittivities) are evaluated at once.
+# Static equations follow Pozar, Microwave Engineering, section 3.8.
+
+c = 299792458
+mu0 = 4e-7*numpy.pi
+
+
+def effective_permittivity(w, d, er):
+    """Static effective permittivity of a microstrip line."""
+    w = numpy.asarray(w, dtype=float)
+    er = numpy.asarray(er, dtype=float)
+    return (er + 1)/2 + (er - 1)/2/numpy.sqrt(1 + 12*d/w)
+
+
+def impedance(w, d, er):
+    """Static characteristic impedance of a microstrip line in ohms."""
+    u = numpy.asarray(w, dtype=float)/d
+    e_eff = effective_permittivity(w, d, er)
+
+    # the narrow strip equation is only evaluated where it is used, so the log does not warn for wide strips
+    narrow = u <= 1
+    z_narrow = 60/numpy.sqrt(e_eff)*numpy.log(8/numpy.where(narrow, u, 1) + u/4)
+    z_wide = 120*numpy.pi/(numpy.sqrt(e_eff)*(u + 1.393 + 0.667*numpy.log(u + 1.444)))
+    return numpy.where(narrow, z_narrow, z_wide)
+
+
+def _kobayashi(u, d, er, e_eff, f):
+    # Kobayashi, IEEE Trans. MTT 1988, accurate to 0.6% from 0.1 < w/d < 10, 1 < er < 128 and any frequency
+    f_tm0 = c*numpy.arctan(er*numpy.sqrt((e_eff - 1)/(er - e_eff)))/(2*numpy.pi*d*numpy.sqrt(er - e_eff))
+    f50 = f_tm0/(0.75 + (0.75 - 0.332/er**1.73)*u)
+
+    m0 = 1 + 1/(1 + numpy.sqrt(u)) + 0.32*(1/(1 + numpy.sqrt(u)))**3
+    mc = numpy.where(u <= 0.7, 1 + 1.4/(1 + u)*(0.15 - 0.235*numpy.exp(-0.45*f/f50)), 1)
+    m = numpy.minimum(m0*mc, 2.32)
+
+    return er - (er - e_eff)/(1 + (f/f50)**m)
+
+
+def _getsinger(u, d, er, e_eff, f):
+    # Getsinger, IEEE Trans. MTT 1973, simpler but less accurate at high frequency
+    z0 = impedance(u*d, d, er)
+    fp = z0/(2*mu0*d)
+    g = 0.6 + 0.009*z0
+
+    return er - (er - e_eff)/(1 + g*(f/fp)**2)
+
+
+dispersion_models = {
+    'kobayashi': _kobayashi,
+    'getsinger': _getsinger,
+}
+
+
+def dispersive_permittivity(w, d, er, f, model='kobayashi'):
+    """Effective permittivity at frequency f with the kobayashi or getsinger dispersion model. It rises from the static value towards er as the frequency increases."""
+    if model not in dispersion_models:
+        raise ValueError("Unknown dispersion model " + str(model) + ", it must be one of " + ', '.join(dispersion_models) + ".")
+
+    u = numpy.asarray(w, dtype=float)/d
+    er = numpy.asarray(er, dtype=float)
+    e_eff = effective_permittivity(w, d, er)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        e_f = dispersion_models[model](u, d, er, e_eff, numpy.asarray(f, dtype=float))
+    # an air line (er == 1) has no dispersion
+    return numpy.where(er > 1, e_f, e_eff)
+
+
+def dispersive_impedance(w, d, er, f, model='kobayashi'):
+    """Characteristic impedance at frequency f, scaled from the static value with the dispersive effective permittivity (Bianco et al.)."""
+    e_eff = effective_permittivity(w, d, er)
+    e_f = dispersive_permittivity(w, d, er, f, model)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scale = numpy.where(e_eff > 1, (e_f - 1)/(e_eff - 1), 1)
+    return impedance(w, d, er)*numpy.sqrt(e_eff/e_f)*scale
+
+
+def width(z0, d, er, f=None, model='kobayashi', umin=1e-3, umax=1e3, tol=1e-9):
+    """Returns the strip width for a characteristic impedance z0, statically or at frequency f.
+    All elements are solved together by bisection on log(w/d) within (umin, umax), to a relative width tolerance of tol. Impedances outside of the range give nan."""
+    z0, d, er = numpy.broadcast_arrays(numpy.asarray(z0, dtype=float), numpy.asarray(d, dtype=float), numpy.asarray(er, dtype=float))
+    if f is not None:
+        z0, d, er, f = numpy.broadcast_arrays(z0, d, er, numpy.asarray(f, dtype=float))
+
+    def z(u):
+        if f is None:
+            return impedance(u*d, d, er)
+        return dispersive_impedance(u*d, d, er, f, model)
+
+    # the impedance falls as the strip gets wider
+    low = numpy.full(z0.shape, numpy.log(umin))
+    high = numpy.full(z0.shape, numpy.log(umax))
+    for i in range(int(numpy.ceil(numpy.log2(numpy.log(umax/umin)/tol)))):
+        mid = (low + high)/2
+        wider = z(numpy.exp(mid)) > z0
+        low = numpy.where(wider, mid, low)
+        high = numpy.where(wider, high, mid)
+
+    u = numpy.exp((low + high)/2)
+    inside = (z0 <= z(umin)) & (z0 >= z(umax))
+    return numpy.where(inside, u*d, numpy.nan)
+
+
+@functools.lru_cache(maxsize=64)
+def width_table(er, points=1024, umin=1e-2, umax=1e2):
+    """Returns the static impedance and log(w/d) over points widths for one er, with the impedance increasing. Tables are memoized, so repeated sweeps only build each one once."""
+    # the static impedance steps slightly at w/d = 1 where the equations change, so both sides of the step are in the table
+    logu = numpy.concatenate((numpy.linspace(numpy.log(umax), 1e-12, points//2), numpy.linspace(0, numpy.log(umin), points - points//2)))
+    z0 = impedance(numpy.exp(logu), 1, er)
+
+    z0.setflags(write=False)
+    logu.setflags(write=False)
+    return z0, logu
+
+
+def lookup_width(z0, d, er, points=1024, umin=1e-2, umax=1e2):
+    """Interpolates the static strip width for z0 from the memoized width_table of each distinct er. Much faster than width for large sweeps, to about 1e-5 relative error with the default table.
+    Impedances outside of the table give nan."""
+    z0, d, er = numpy.broadcast_arrays(numpy.asarray(z0, dtype=float), numpy.asarray(d, dtype=float), numpy.asarray(er, dtype=float))
+
+    logu = numpy.empty(z0.shape)
+    values, groups = numpy.unique(er, return_inverse=True)
+    groups = groups.reshape(er.shape)
+    for k, e in enumerate(values):
+        table_z0, table_logu = width_table(float(e), points, umin, umax)
+        group = groups == k
+        logu[group] = numpy.interp(z0[group], table_z0, table_logu, left=numpy.nan, right=numpy.nan)
+
+    return numpy.exp(logu)*d
@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+import numpy
+
+# Y-factor noise figure calculations for raw hot/cold readings, e.g. from NoiseFigure_8970B.meas_temp or archives of them.
+# Every function broadcasts its arguments, with frequency normally the last axis, so many DUTs (e.g. an array of shape (duts, frequency)) are processed at once.
+# Hot and cold readings may be noise temperatures or powers in any linear unit (only their ratios are used), or in dB with db=True.
+# Equations follow Keysight application note 57-1, Fundamentals of RF and Microwave Noise Figure Measurements.
+
+k = 1.380649e-23
+t0 = 290
+
+# y is the Y factor, te the effective input noise temperature in K, nf the noise figure in dB and gain the insertion gain in dB (nan without calibration readings)
+y_factor_result = namedtuple('y_factor_result', ['y', 'te', 'nf', 'gain'])
+
+
+def to_linear(x, db=True):
+    """Converts dB values to linear power ratios, or returns x as an array if db is False."""
+    x = numpy.asarray(x, dtype=float)
+    return numpy.power(10, x/10) if db else x
+
+
+def to_db(x):
+    """Converts linear power ratios to dB."""
+    return 10*numpy.log10(x)
+
+
+def interpolate_enr(f, enr_pairs):
+    """Interpolates the ENR (dB) of a noise source at the frequencies f from a table of (frequency, ENR) pairs, as given to NoiseFigure_8970B.load_enr.
+    The table frequencies must be in the same unit as f, and frequencies outside of the table get the ENR of the nearest end, as on the 8970B."""
+    enr_pairs = numpy.asarray(enr_pairs, dtype=float).reshape(-1, 2)
+    order = numpy.argsort(enr_pairs[:, 0])
+    return numpy.interp(f, enr_pairs[order, 0], enr_pairs[order, 1])
+
+
+def hot_temperature(enr):
+    """Returns the noise temperature (K) of a noise source when it is on, from its ENR in dB (which is defined relative to 290 K)."""
+    return t0*(to_linear(enr) + 1)
+
+
+def y_factor(hot, cold, db=False):
+    """Returns the linear Y factor of hot and cold readings."""
+    if db:
+        return to_linear(numpy.asarray(hot, dtype=float) - cold)
+    return to_linear(hot, False)/to_linear(cold, False)
+
+
+def effective_temperature(y, enr, t_cold=t0):
+    """Returns the effective input noise temperature (K) from the Y factor and the ENR (dB) of the noise source. t_cold is the temperature of the source when it is off."""
+    y = numpy.asarray(y, dtype=float)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return (hot_temperature(enr) - y*t_cold)/(y - 1)
+
+
+def temperature_to_nf(te):
+    """Converts an effective noise temperature (K) into a noise figure (dB)."""
+    return to_db(1 + numpy.asarray(te, dtype=float)/t0)
+
+
+def nf_to_temperature(nf):
+    """Converts a noise figure (dB) into an effective noise temperature (K)."""
+    return t0*(to_linear(nf) - 1)
+
+
+def gain(hot, cold, cal_hot, cal_cold, db=False):
+    """Returns the insertion gain (dB) of a DUT from the hot and cold readings with the DUT and the calibration readings without it (the second stage alone)."""
+    hot, cold, cal_hot, cal_cold = (to_linear(x, db) for x in (hot, cold, cal_hot, cal_cold))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return to_db((hot - cold)/(cal_hot - cal_cold))
+
+
+def second_stage_correction(nf_total, gain_db, nf_second):
+    """Removes the contribution of the second stage (the measurement receiver) from a system noise figure with the Friis equation. All values are in dB.
+    This corrects, for example, the uncorrected noise figure of PSA_E4448A.get_noise_figure with a separately measured receiver noise figure."""
+    f_total = to_linear(nf_total)
+    f_second = to_linear(nf_second)
+    return to_db(f_total - (f_second - 1)/to_linear(gain_db))
+
+
+def analyze(hot, cold, enr, cal_hot=None, cal_cold=None, t_cold=t0, db=False):
+    """Computes the Y factor, effective temperature, noise figure and gain of DUT hot/cold readings. enr is in dB (see interpolate_enr).
+    With calibration readings (the hot/cold readings of the measurement system without the DUT), the second stage contribution is removed and the gain is computed,
+    as the 8970B does for its corrected measurements. Otherwise the results are those of the whole system and the gain is nan."""
+    y = y_factor(hot, cold, db)
+    te = effective_temperature(y, enr, t_cold)
+
+    if cal_hot is None or cal_cold is None:
+        g = numpy.full(numpy.shape(te), numpy.nan)
+    else:
+        g = gain(hot, cold, cal_hot, cal_cold, db)
+        te_second = effective_temperature(y_factor(cal_hot, cal_cold, db), enr, t_cold)
+        # the Friis equation in temperatures, T1 = T12 - T2/G1
+        te = te - te_second/to_linear(g)
+
+    return y_factor_result(y, te, temperature_to_nf(te), g)
@@ -0,0 +1,122 @@
+import numpy
+
+# Stability, gain and noise circle calculations for two port s parameters.
+# Every function works on arrays of shape (..., 2, 2), e.g. (devices, bias points, frequency, 2, 2), and returns arrays of the leading shape.
+# Circles are returned as (center, radius) pairs of complex centers and real radii, which jdsmith.plot_circles draws in bulk.
+# Equations follow Pozar, Microwave Engineering, chapters 11 and 12.
+
+
+def split(s):
+    """Returns s11, s12, s21, s22 of an (..., 2, 2) array."""
+    s = numpy.asarray(s)
+    return s[..., 0, 0], s[..., 0, 1], s[..., 1, 0], s[..., 1, 1]
+
+
+def delta(s):
+    """Determinant of the s parameter matrix."""
+    s11, s12, s21, s22 = split(s)
+    return s11*s22 - s12*s21
+
+
+def rollett_k(s):
+    """Rollett stability factor K. The device is unconditionally stable when K > 1 and |delta| < 1."""
+    s11, s12, s21, s22 = split(s)
+    d = delta(s)
+    return (1 - numpy.abs(s11)**2 - numpy.abs(s22)**2 + numpy.abs(d)**2)/(2*numpy.abs(s12*s21))
+
+
+def mu(s, port='input'):
+    """Edwards-Sinsky stability factor mu (input) or mu' (output). The device is unconditionally stable when mu > 1, and a larger mu is more stable."""
+    s11, s12, s21, s22 = split(s)
+    d = delta(s)
+
+    if port == 'input':
+        return (1 - numpy.abs(s11)**2)/(numpy.abs(s22 - d*numpy.conj(s11)) + numpy.abs(s12*s21))
+    elif port == 'output':
+        return (1 - numpy.abs(s22)**2)/(numpy.abs(s11 - d*numpy.conj(s22)) + numpy.abs(s12*s21))
+    else:
+        raise ValueError("Port " + str(port) + " must be either input or output.")
+
+
+def stability_circles(s, port='input'):
+    """Returns the center, radius and stable_outside of the input (source plane) or output (load plane) stability circles.
+    stable_outside is True where the center of the circle is unstable, i.e. the inside of the circle is the region to avoid."""
+    s11, s12, s21, s22 = split(s)
+    d = delta(s)
+
+    if port == 'input':
+        sa, sb = s11, s22
+    elif port == 'output':
+        sa, sb = s22, s11
+    else:
+        raise ValueError("Port " + str(port) + " must be either input or output.")
+
+    den = numpy.abs(sa)**2 - numpy.abs(d)**2
+    c = numpy.conj(sa - d*numpy.conj(sb))/den
+    r = numpy.abs(s12*s21/den)
+
+    # check if the center of the circle is a stable or unstable point
+    stable_outside = numpy.abs(sb + s12*s21*c/(1-sa*c)) > 1
+
+    return c, r, stable_outside
+
+
+def max_gain(s):
+    """Returns the maximum available gain (when K > 1) or the maximum stable gain (otherwise) in dB."""
+    s11, s12, s21, s22 = split(s)
+    k = rollett_k(s)
+    ratio = numpy.abs(s21/s12)
+
+    # the sqrt argument is clipped so potentially unstable points give the maximum stable gain without warnings
+    g = numpy.where(k > 1, ratio*(k - numpy.sqrt(numpy.maximum(k*k - 1, 0))), ratio)
+    return 10*numpy.log10(g)
+
+
+def _gain_circles(s, gain_db, port):
+    s11, s12, s21, s22 = split(s)
+    d = delta(s)
+    k = rollett_k(s)
+
+    if port == 'input':
+        sa, sb = s11, s22
+    else:
+        sa, sb = s22, s11
+
+    # gain normalized to |s21|^2
+    g = numpy.power(10, numpy.asarray(gain_db)/10)/numpy.abs(s21)**2
+    den = 1 + g*(numpy.abs(sa)**2 - numpy.abs(d)**2)
+    c = g*numpy.conj(sa - d*numpy.conj(sb))/den
+
+    # circles for gains above the maximum do not exist, their radius is nan
+    p = numpy.abs(s12*s21)
+    r2 = 1 - 2*k*p*g + (p*g)**2
+    r = numpy.sqrt(numpy.where(r2 >= 0, r2, numpy.nan))/numpy.abs(den)
+
+    return c, r
+
+
+def available_gain_circles(s, gain_db):
+    """Returns the center and radius of the constant available gain circles in the source plane. gain_db broadcasts against the leading shape of s."""
+    return _gain_circles(s, gain_db, 'input')
+
+
+def operating_gain_circles(s, gain_db):
+    """Returns the center and radius of the constant operating (power) gain circles in the load plane. gain_db broadcasts against the leading shape of s."""
+    return _gain_circles(s, gain_db, 'output')
+
+
+def noise_circles(nfmin, gamma_opt, rn, nf, z0=50):
+    """Returns the center and radius of the constant noise figure circles in the source plane.
+    nfmin and nf are in dB, gamma_opt is the optimum source reflection coefficient, and rn is the noise resistance in ohms. All arguments broadcast."""
+    fmin = numpy.power(10, numpy.asarray(nfmin)/10)
+    f = numpy.power(10, numpy.asarray(nf)/10)
+    gamma_opt = numpy.asarray(gamma_opt)
+
+    n = (f - fmin)/(4*numpy.asarray(rn)/z0)*numpy.abs(1 + gamma_opt)**2
+
+    # noise figures below nfmin do not have a circle, their radius is nan
+    r2 = n*(n + 1 - numpy.abs(gamma_opt)**2)
+    c = gamma_opt/(n + 1)
+    r = numpy.sqrt(numpy.where(r2 >= 0, r2, numpy.nan))/(n + 1)
+
+    return c, r
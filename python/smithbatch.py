@@ -0,0 +1,192 @@
+import argparse
+import collections
+import concurrent.futures
+import glob
+import os
+import traceback
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import jdsmith
+import touchstone
+
+file_patterns = ('*.s[0-9]p', '*.s[0-9][0-9]p', '*.ts')
+
+# per worker state, created by _init_worker
+_figure = None
+_smith = None
+_baseline = None
+
+
+def find_files(path):
+    """Returns the sorted list of S-parameter files for a file, directory or glob pattern."""
+    if os.path.isdir(path):
+        files = []
+        for p in file_patterns:
+            files += glob.glob(os.path.join(path, p))
+        return sorted(files)
+
+    if os.path.isfile(path):
+        return [path]
+
+    return sorted(glob.glob(path))
+
+
+def parse_param(param):
+    """Converts a parameter name like S21 into the (row, column) index of the s array."""
+    param = param.upper()
+    if len(param) != 3 or param[0] != 'S' or not param[1:].isdigit():
+        raise ValueError("Parameter " + param + " must be of the form S11, S21, etc.")
+    return int(param[1]) - 1, int(param[2]) - 1
+
+
+def load(path):
+    """Returns the frequency and (N, ports, ports) s parameter arrays of a touchstone file."""
+    network = touchstone.read(path)
+    return network.f, network.s
+
+
+def _init_worker(figsize, fontsize, dpi, raster):
+    global _figure, _smith, _baseline
+
+    # the figure is created at the output dpi so a rastered grid is rendered at the final resolution
+    _figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(_figure)
+    ax = _figure.add_subplot()
+    _smith = jdsmith.jdsmith(ax, fontsize=fontsize, raster=raster)
+
+    # everything on the axis at this point is the chart itself, anything added later is removed between jobs
+    _baseline = set(ax.get_children())
+
+
+def _reset_chart():
+    ax = _smith.axis
+    for a in ax.get_children():
+        if a not in _baseline:
+            a.remove()
+
+    # restart the color cycle so every chart looks the same regardless of what the worker rendered before
+    ax.set_prop_cycle(None)
+    _smith.traces.clear()
+
+
+def _render(files, params, output, dpi, linewidth, arrowscale):
+    """Renders one chart with every parameter of every file overlaid. Returns the output path and None, or the error text."""
+    try:
+        _reset_chart()
+
+        count = 0
+        for path in files:
+            _, s = load(path)
+            name = os.path.splitext(os.path.basename(path))[0]
+            for p in params:
+                i, j = parse_param(p)
+                if i >= s.shape[1] or j >= s.shape[2]:
+                    continue
+                _smith.plot(s[:, i, j], label=name + ' ' + p.upper(), linewidth=linewidth, arrowscale=arrowscale)
+                count += 1
+
+        # a chart without traces is an error, so missing parameters are reported rather than saved as a blank chart
+        if count == 0:
+            return output, "None of the parameters " + ', '.join(p.upper() for p in params) + " are in " + ', '.join(files) + ".\n"
+
+        if count > 1:
+            _smith.axis.legend(loc='upper left', bbox_to_anchor=(0, 1), fontsize='x-small')
+
+        _figure.savefig(output, dpi=dpi)
+        return output, None
+
+    except Exception:
+        return output, traceback.format_exc()
+
+
+def _unique_names(names, parents):
+    # names shared by several charts get the name of their parent directory in front, then a counter if that is not enough, so no chart overwrites another
+    counts = collections.Counter(names)
+    names = [parent + '_' + name if counts[name] > 1 and parent else name for name, parent in zip(names, parents)]
+
+    used = set()
+    unique = []
+    for name in names:
+        candidate = name
+        k = 1
+        while candidate in used:
+            k += 1
+            candidate = name + '_' + str(k)
+        used.add(candidate)
+        unique.append(candidate)
+    return unique
+
+
+def make_jobs(paths, outdir, fmt, overlay=False):
+    """Returns a list of (files, output path) tuples. Without overlay there is one chart per file, with overlay one chart per entry of paths.
+    Every output path is unique, files with the same name in different directories are prefixed with their directory name."""
+    groups = []
+    names = []
+    parents = []
+    for k, path in enumerate(paths):
+        files = find_files(path)
+        if len(files) == 0:
+            continue
+
+        if overlay:
+            if os.path.isdir(path):
+                path = os.path.normpath(os.path.abspath(path))
+                names.append(os.path.basename(path))
+                parents.append(os.path.basename(os.path.dirname(path)))
+            else:
+                names.append('group' + str(k))
+                parents.append('')
+            groups.append(files)
+        else:
+            for f in files:
+                names.append(os.path.splitext(os.path.basename(f))[0])
+                parents.append(os.path.basename(os.path.dirname(os.path.abspath(f))))
+                groups.append([f])
+
+    return [(files, os.path.join(outdir, name + '.' + fmt)) for files, name in zip(groups, _unique_names(names, parents))]
+
+
+def render(paths, params=('S11',), outdir='.', fmt='png', overlay=False, workers=None, figsize=(3.5, 3.5), fontsize=6, dpi=300, raster=False, linewidth=1, arrowscale=8):
+    """Renders every chart across a pool of worker processes. Returns a list of (output path, error) tuples, where error is None on success."""
+    os.makedirs(outdir, exist_ok=True)
+    jobs = make_jobs(paths, outdir, fmt, overlay)
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(figsize, fontsize, dpi, raster)) as pool:
+        futures = [pool.submit(_render, files, params, output, dpi, linewidth, arrowscale) for files, output in jobs]
+        for f in concurrent.futures.as_completed(futures):
+            results.append(f.result())
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render smith charts for S-parameter files in parallel.')
+    parser.add_argument('paths', nargs='+', help='touchstone files, directories or glob patterns')
+    parser.add_argument('--param', nargs='+', default=['S11'], help='parameters to plot (default S11)')
+    parser.add_argument('--format', default='png', choices=['png', 'pdf', 'svg'], help='output format')
+    parser.add_argument('--outdir', default='.', help='output directory')
+    parser.add_argument('--overlay', action='store_true', help='overlay all files of each path on one chart')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes (default is the number of cores)')
+    parser.add_argument('--figsize', type=float, nargs=2, default=(3.5, 3.5), help='figure width and height in inches')
+    parser.add_argument('--fontsize', type=float, default=6, help='grid label font size')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--raster', action='store_true', help='draw the grid as an image (smaller pdf and svg files)')
+    args = parser.parse_args(argv)
+
+    results = render(args.paths, args.param, args.outdir, args.format, args.overlay, args.jobs, tuple(args.figsize), args.fontsize, args.dpi, args.raster)
+
+    failed = 0
+    for output, error in results:
+        if error is not None:
+            failed += 1
+            print('[Failed] ' + output + '\n' + error)
+
+    print('Rendered ' + str(len(results) - failed) + ' of ' + str(len(results)) + ' charts.')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+import hashlib
+import os
+import re
+import warnings
+from collections import namedtuple
+
+import numpy
+
+# f is the frequency in Hz, s is the (N, ports, ports) array of s parameters, and z0 the reference impedance of each port.
+# noise is None, or noise_data for two port files that include noise parameters.
+network = namedtuple('network', ['f', 's', 'z0', 'noise'])
+
+# f in Hz, nfmin in dB, gamma_opt complex, rn in ohms
+noise_data = namedtuple('noise_data', ['f', 'nfmin', 'gamma_opt', 'rn'])
+
+units = {
+    'HZ': 1,
+    'KHZ': 1e3,
+    'MHZ': 1e6,
+    'GHZ': 1e9,
+}
+
+# bumped whenever the layout of the cache files changes
+cache_version = 1
+
+_keyword = re.compile(r'^[ \t]*\[([^\]]+)\][ \t]*', re.MULTILINE)
+_comment = re.compile(r'!.*')
+_extension = re.compile(r'\.s(\d+)p$', re.IGNORECASE)
+
+
+def parse_options(line):
+    """Parses the option line (without the #) into frequency multiplier, parameter, format and reference resistance. Missing fields get the touchstone defaults (GHz S MA R 50)."""
+    multiplier, parameter, fmt, resistance = 1e9, 'S', 'MA', 50.0
+
+    tokens = line.upper().split()
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t in units:
+            multiplier = units[t]
+        elif t in ('S', 'Y', 'Z', 'H', 'G'):
+            parameter = t
+        elif t in ('MA', 'DB', 'RI'):
+            fmt = t
+        elif t == 'R':
+            i += 1
+            resistance = float(tokens[i])
+        else:
+            raise ValueError("Unknown touchstone option " + t + ".")
+        i += 1
+
+    return multiplier, parameter, fmt, resistance
+
+
+def to_complex(a, b, fmt):
+    """Converts pairs of values in a touchstone format (RI, MA or DB) into complex numbers."""
+    if fmt == 'RI':
+        return a + 1j*b
+    elif fmt == 'MA':
+        return a*numpy.exp(1j*numpy.deg2rad(b))
+    elif fmt == 'DB':
+        return numpy.power(10, a/20)*numpy.exp(1j*numpy.deg2rad(b))
+    else:
+        raise ValueError("Unknown touchstone format " + fmt + ".")
+
+
+def to_s(p, parameter):
+    """Converts an (N, ports, ports) array of normalized Z or Y parameters to S parameters."""
+    if parameter == 'S':
+        return p
+
+    identity = numpy.eye(p.shape[1])
+    if parameter == 'Z':
+        # S = (z - I)(z + I)^-1 = ((z + I)^-T (z - I)^T)^T
+        return numpy.swapaxes(numpy.linalg.solve(numpy.swapaxes(p + identity, 1, 2), numpy.swapaxes(p - identity, 1, 2)), 1, 2)
+    elif parameter == 'Y':
+        # S = (I - y)(I + y)^-1
+        return numpy.swapaxes(numpy.linalg.solve(numpy.swapaxes(identity + p, 1, 2), numpy.swapaxes(identity - p, 1, 2)), 1, 2)
+    else:
+        raise ValueError("Conversion of " + parameter + " parameters to S parameters is not supported.")
+
+
+def to_values(text):
+    """Converts whitespace separated numbers into a float array."""
+    with warnings.catch_warnings():
+        # fromstring only warns when it stops early on text which is not a number
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return numpy.fromstring(text, sep=' ')
+        except DeprecationWarning:
+            raise ValueError("Touchstone data contains text which is not a number.")
+
+
+def _split_sections(text):
+    """Returns a list of (keyword, content) for a version 2 file, where content is all text until the next keyword."""
+    matches = list(_keyword.finditer(text))
+    sections = []
+    for k, m in enumerate(matches):
+        end = matches[k+1].start() if k + 1 < len(matches) else len(text)
+        sections.append((m.group(1).strip().upper(), text[m.end():end]))
+    return sections
+
+
+def parse(text, ports=None):
+    """Parses the text of a touchstone version 1 or 2 file. ports is required for version 1 files (it normally comes from the .sNp file extension)."""
+    # the regular expressions are only run when needed, as they are slow compared to the numeric parsing on large files
+    if '!' in text:
+        text = _comment.sub('', text)
+
+    # with comments removed, the only # is the option line
+    i = text.find('#')
+    if i >= 0:
+        end = text.find('\n', i)
+        end = len(text) if end < 0 else end
+        multiplier, parameter, fmt, resistance = parse_options(text[i+1:end])
+        text = text[:i] + text[end:]
+    else:
+        multiplier, parameter, fmt, resistance = parse_options('')
+
+    # version 2 keywords, version 1 files only have data (and no keywords)
+    order = '21_12'
+    matrix = 'FULL'
+    z0 = None
+    count = None
+    noise_text = ''
+    normalized = True
+
+    sections = _split_sections(text) if '[' in text else []
+    if len(sections) == 0:
+        if ports is None:
+            raise ValueError("The number of ports is required for touchstone version 1 files.")
+        data_text = text
+    else:
+        normalized = False
+        data_text = ''
+        for keyword, content in sections:
+            if keyword == 'VERSION':
+                pass
+            elif keyword == 'NUMBER OF PORTS':
+                ports = int(content.split()[0])
+            elif keyword == 'TWO-PORT DATA ORDER':
+                order = content.split()[0]
+            elif keyword == 'NUMBER OF FREQUENCIES':
+                count = int(content.split()[0])
+            elif keyword == 'REFERENCE':
+                z0 = numpy.asarray(content.split(), dtype=float)
+            elif keyword == 'MATRIX FORMAT':
+                matrix = content.split()[0].upper()
+            elif keyword == 'NETWORK DATA':
+                data_text = content
+            elif keyword == 'NOISE DATA':
+                noise_text = content
+            elif keyword == 'MIXED-MODE ORDER':
+                raise ValueError("Mixed mode touchstone files are not supported.")
+            # everything else (information blocks, noise frequency count, end) is ignored
+
+    if z0 is None:
+        z0 = numpy.full(ports, resistance)
+
+    values = to_values(data_text)
+
+    # number of values per frequency
+    if matrix == 'FULL':
+        width = 1 + 2*ports*ports
+    else:
+        width = 1 + ports*(ports + 1)
+
+    if count is None:
+        count = len(values)//width
+        if ports == 2:
+            # version 1 two port noise data follows the network data, starting at the first frequency which is not above the previous one
+            drop = numpy.flatnonzero(numpy.diff(values[0::width]) <= 0)
+            if len(drop):
+                count = drop[0] + 1
+            noise_text = None
+
+    network_values = values[:count*width].reshape(count, width)
+    f = network_values[:, 0]*multiplier
+    pairs = network_values[:, 1:]
+    p = to_complex(pairs[:, 0::2], pairs[:, 1::2], fmt)
+
+    if matrix == 'FULL':
+        p = p.reshape(count, ports, ports)
+        if ports == 2 and order == '21_12':
+            p = numpy.swapaxes(p, 1, 2)
+    else:
+        full = numpy.zeros((count, ports, ports), dtype=complex)
+        if matrix == 'LOWER':
+            i, j = numpy.tril_indices(ports)
+        else:
+            i, j = numpy.triu_indices(ports)
+        full[:, i, j] = p
+        full[:, j, i] = p
+        p = full
+
+    if parameter != 'S':
+        if not normalized:
+            # version 2 Z and Y parameters are in ohms and siemens
+            scale = numpy.sqrt(z0)
+            if parameter == 'Z':
+                p = p/(scale[:, None]*scale[None, :])
+            elif parameter == 'Y':
+                p = p*(scale[:, None]*scale[None, :])
+        p = to_s(p, parameter)
+
+    noise = None
+    if noise_text is None:
+        noise_values = values[count*width:]
+    else:
+        noise_values = to_values(noise_text)
+
+    if len(noise_values) >= 5:
+        n = noise_values[:len(noise_values)//5*5].reshape(-1, 5)
+        noise = noise_data(n[:, 0]*multiplier, n[:, 1], to_complex(n[:, 2], n[:, 3], 'MA'), n[:, 4]*z0[0])
+
+    return network(f, p, z0, noise)
+
+
+def _cache_path(path):
+    return path + '.npz'
+
+
+def _load_cache(path, stat):
+    cache = _cache_path(path)
+    if not os.path.exists(cache):
+        return None, None
+
+    try:
+        with numpy.load(cache, allow_pickle=False) as data:
+            if int(data['version']) != cache_version or int(data['size']) != stat.st_size:
+                return None, None
+
+            if int(data['mtime']) != stat.st_mtime_ns:
+                # the file was touched, it is only reparsed if its contents changed
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                if hashlib.sha1(raw).hexdigest() != str(data['sha1']):
+                    return None, raw
+
+            noise = None
+            if 'noise_f' in data:
+                noise = noise_data(data['noise_f'], data['noise_nfmin'], data['noise_gamma_opt'], data['noise_rn'])
+            net = network(data['f'], data['s'], data['z0'], noise)
+            arrays = {k: data[k] for k in data.files}
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+    if arrays['mtime'] != stat.st_mtime_ns:
+        _save_cache(path, stat, arrays)
+
+    return net, None
+
+
+def _save_cache(path, stat, arrays):
+    arrays['mtime'] = numpy.int64(stat.st_mtime_ns)
+    cache = _cache_path(path)
+    temp = cache + '.' + str(os.getpid()) + '.tmp'
+    try:
+        # uncompressed, so loading is a plain copy with no parsing
+        with open(temp, 'wb') as f:
+            numpy.savez(f, **arrays)
+        os.replace(temp, cache)
+    except OSError:
+        # a read only data directory just means no caching
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def read(path, ports=None, cache=True):
+    """Reads a touchstone (.sNp or .ts) file and returns a network(f, s, z0, noise). Y and Z parameter files are converted to S parameters.
+    If cache is True, the parsed arrays are kept in a sidecar path + '.npz' file which is reused until the file changes (checked by size, modification time and then hash)."""
+    if ports is None:
+        m = _extension.search(path)
+        if m:
+            ports = int(m.group(1))
+
+    stat = os.stat(path)
+    raw = None
+    if cache:
+        net, raw = _load_cache(path, stat)
+        if net is not None:
+            return net
+
+    if raw is None:
+        with open(path, 'rb') as f:
+            raw = f.read()
+
+    net = parse(raw.decode('latin-1'), ports)
+
+    if cache:
+        arrays = {
+            'version': numpy.int64(cache_version),
+            'size': numpy.int64(stat.st_size),
+            'sha1': numpy.str_(hashlib.sha1(raw).hexdigest()),
+            'f': net.f,
+            's': net.s,
+            'z0': net.z0,
+        }
+        if net.noise is not None:
+            arrays.update(noise_f=net.noise.f, noise_nfmin=net.noise.nfmin, noise_gamma_opt=net.noise.gamma_opt, noise_rn=net.noise.rn)
+        _save_cache(path, stat, arrays)
+
+    return net
@@ -0,0 +1,178 @@
+from collections import namedtuple
+
+import numpy
+
+# Host side waveform measurements, replacing the per value :MEAS queries of DSOX_OScope.
+# v is an array of shape (..., points), e.g. one waveform from get_waveform, (segments, points) from get_segmented_waveforms, or (channels, segments, points).
+# t is the matching time axis, normally the (points,) array returned with the waveform. Every measurement is computed along the last axis for all waveforms at once.
+# Levels follow the scope's defaults: top and base are the most common high and low levels, and edges are measured between 10% and 90% with timing at 50%.
+
+# every measurement of measure, each of the leading shape of v (nan where it is not defined, e.g. the period of a waveform with less than two rising edges)
+measurements = namedtuple('measurements', ['vpp', 'vmax', 'vmin', 'top', 'base', 'amplitude', 'mean', 'rms', 'ac_rms', 'period', 'frequency', 'rise_time', 'fall_time', 'duty_cycle', 'overshoot', 'preshoot'])
+
+
+def vpp(v):
+    """Peak to peak voltage."""
+    return numpy.nanmax(v, axis=-1) - numpy.nanmin(v, axis=-1)
+
+
+def top_base(v):
+    """Returns the top and base levels, the medians of the samples above and below the middle of the peak to peak range. Unlike the maximum and minimum, they ignore overshoot and noise."""
+    v = numpy.asarray(v, dtype=float)
+    middle = ((numpy.nanmax(v, axis=-1) + numpy.nanmin(v, axis=-1))/2)[..., None]
+
+    # one sort gives both medians, as the samples below and above the middle are the start and end of each sorted waveform (before any nan)
+    ordered = numpy.sort(v, axis=-1)
+    below = numpy.sum(v < middle, axis=-1)
+    above = numpy.sum(v <= middle, axis=-1)
+    valid = numpy.sum(~numpy.isnan(v), axis=-1)
+
+    def median(start, stop, flat):
+        # a flat waveform has no samples above or below the middle, both levels are then the middle itself
+        a = numpy.take_along_axis(ordered, numpy.clip((start + stop - 1)//2, 0, None)[..., None], axis=-1)[..., 0]
+        b = numpy.take_along_axis(ordered, numpy.clip((start + stop)//2, 0, v.shape[-1] - 1)[..., None], axis=-1)[..., 0]
+        return numpy.where(stop > start, (a + b)/2, flat)
+
+    return median(above, valid, middle[..., 0]), median(0, below, middle[..., 0])
+
+
+def amplitude(v):
+    """Top minus base voltage, see top_base."""
+    top, base = top_base(v)
+    return top - base
+
+
+def rms(v, ac=False):
+    """RMS voltage, with the mean removed if ac is True."""
+    v = numpy.asarray(v, dtype=float)
+    if ac:
+        v = v - numpy.nanmean(v, axis=-1)[..., None]
+    return numpy.sqrt(numpy.nanmean(v*v, axis=-1))
+
+
+def _last(condition):
+    # index of the last sample at or before each sample where condition is True (-1 if there is none)
+    index = numpy.where(condition, numpy.arange(condition.shape[-1], dtype=numpy.int32), numpy.int32(-1))
+    return numpy.maximum.accumulate(index, axis=-1)
+
+
+def edges(t, v, low=0.1, middle=0.5, high=0.9, top=None, base=None):
+    """Finds the rising and falling edges of v. An edge is a transition from below the low level to above the high level (or back), where low, middle and high are fractions of the amplitude.
+    Returns the rise time, fall time, period and high time (from the middle of a rising edge to the middle of the next falling edge), averaged over each waveform."""
+    v = numpy.asarray(v, dtype=float)
+    if top is None or base is None:
+        top, base = top_base(v)
+
+    # work on a 2D (waveforms, points) array
+    shape = v.shape[:-1]
+    points = v.shape[-1]
+    v = v.reshape(-1, points)
+    t = numpy.broadcast_to(numpy.asarray(t, dtype=float), shape + (points,)).reshape(-1, points)
+    base = numpy.broadcast_to(base, shape).reshape(-1, 1)
+    a = numpy.broadcast_to(top, shape).reshape(-1, 1) - base
+    lo = base + low*a
+    mid = base + middle*a
+    hi = base + high*a
+
+    # the signal is high after it goes above hi and low after it goes below lo, the levels in between are hysteresis so noise does not add edges
+    last_below = _last(v <= lo)
+    last_above = _last(v >= hi)
+    state = last_above > last_below
+    change = (state[:, 1:] != state[:, :-1]) & ((last_above[:, :-1] >= 0) | (last_below[:, :-1] >= 0))
+
+    # the (few) edges are handled as flat arrays, in order of waveform and then time. j is the sample where the state changed
+    w, j = numpy.nonzero(change)
+    j = j + 1
+    rising = state[w, j]
+
+    def crossing(k, level):
+        # interpolated time at which the waveform crosses level between samples k and k + 1
+        k = numpy.clip(k, 0, points - 2)
+        v0 = v[w, k]
+        t0 = t[w, k]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return t0 + (t[w, k + 1] - t0)*(level - v0)/(v[w, k + 1] - v0)
+
+    # every edge ends at the sample where the state changed, and starts after the last sample on the other side
+    start = crossing(numpy.where(rising, last_below[w, j], last_above[w, j]), numpy.where(rising, lo[w, 0], hi[w, 0]))
+    end = crossing(j - 1, numpy.where(rising, hi[w, 0], lo[w, 0]))
+    middle_time = crossing(numpy.where(rising, _last(v <= mid)[w, j], _last(v >= mid)[w, j]), mid[w, 0])
+
+    count = len(v)
+    rises = numpy.bincount(w, rising, count)
+    falls = numpy.bincount(w, ~rising, count)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        # waveforms without edges give nan
+        rise_time = numpy.bincount(w, numpy.where(rising, end - start, 0), count)/rises
+        fall_time = numpy.bincount(w, numpy.where(rising, 0, end - start), count)/falls
+
+        # the period is the average spacing of the rising edges
+        first = numpy.full(count, numpy.inf)
+        last = numpy.full(count, -numpy.inf)
+        numpy.minimum.at(first, w[rising], middle_time[rising])
+        numpy.maximum.at(last, w[rising], middle_time[rising])
+        period = (last - first)/(rises - 1)
+        period[rises < 2] = numpy.nan
+
+        # edges alternate, so the high time ends at every falling edge that follows an edge of the same waveform
+        after = numpy.flatnonzero(~rising[1:] & (w[1:] == w[:-1])) + 1
+        highs = numpy.bincount(w[after], None, count)
+        high_time = numpy.bincount(w[after], middle_time[after] - middle_time[after - 1], count)/highs
+
+    return rise_time.reshape(shape), fall_time.reshape(shape), period.reshape(shape), high_time.reshape(shape)
+
+
+def period(t, v):
+    """Average period, from the rising edges."""
+    return edges(t, v)[2]
+
+
+def frequency(t, v):
+    """Average frequency, from the rising edges."""
+    return 1/period(t, v)
+
+
+def rise_time(t, v, low=0.1, high=0.9):
+    """Average rise time from low to high (fractions of the amplitude)."""
+    return edges(t, v, low=low, high=high)[0]
+
+
+def fall_time(t, v, low=0.1, high=0.9):
+    """Average fall time from high to low (fractions of the amplitude)."""
+    return edges(t, v, low=low, high=high)[1]
+
+
+def duty_cycle(t, v):
+    """Average positive duty cycle in percent."""
+    _, _, p, high_time = edges(t, v)
+    return 100*high_time/p
+
+
+def overshoot(v):
+    """Overshoot above the top level, in percent of the amplitude."""
+    top, base = top_base(v)
+    return 100*(numpy.nanmax(v, axis=-1) - top)/(top - base)
+
+
+def preshoot(v):
+    """Undershoot below the base level, in percent of the amplitude."""
+    top, base = top_base(v)
+    return 100*(base - numpy.nanmin(v, axis=-1))/(top - base)
+
+
+def measure(t, v, low=0.1, middle=0.5, high=0.9):
+    """Computes every measurement of v at once, sharing the intermediate results. Returns measurements."""
+    v = numpy.asarray(v, dtype=float)
+    vmax = numpy.nanmax(v, axis=-1)
+    vmin = numpy.nanmin(v, axis=-1)
+    top, base = top_base(v)
+    a = top - base
+    mean = numpy.nanmean(v, axis=-1)
+    r = rms(v)
+
+    rise, fall, p, high_time = edges(t, v, low, middle, high, top, base)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return measurements(vmax - vmin, vmax, vmin, top, base, a, mean, r, numpy.sqrt(numpy.maximum(r*r - mean*mean, 0)), p, 1/p, rise, fall,
+                            100*high_time/p, 100*(vmax - top)/a, 100*(base - vmin)/a)